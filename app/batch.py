@@ -0,0 +1,170 @@
+# app/batch.py
+"""
+Bulk ingestion: summarize a solicitation package (base RFP, amendments, PWS,
+attachments) uploaded as several files or one ZIP.
+
+  POST /summarize-batch/  -> stage_batch() stages every document on disk,
+                             summarize_batch_stream() runs them and streams
+                             per-document progress
+
+Documents are pipelined, not run one after another: each is parsed as soon as
+one of BATCH_PARSE_CONCURRENCY parse slots is free and goes straight on to
+summarization, where all documents draw from one shared pool of
+BATCH_LLM_CONCURRENCY LLM slots (each still tagged with its own upload id for
+the scheduler's fairness). The new Summary rows are written together in one
+transaction once every document has finished. A failing document is reported
+and skipped; it does not abort the rest of the batch.
+"""
+
+import os
+import uuid
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.metrics import pipeline_trace, stage
+from app.parser import parse_document
+from app.revisions import SectionLedger, revision_finder
+from app.services import (
+    find_summary_by_hash, load_summary_sections, store_summaries, summary_payload,
+)
+from app.streaming import drain_until_done
+from app.summarization import summarize_sections_stream
+from app.uploads import StagedUpload
+
+BATCH_PARSE_CONCURRENCY = int(os.getenv("BATCH_PARSE_CONCURRENCY", "4"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "16"))
+
+
+async def summarize_batch_stream(
+    db: AsyncSession,
+    uploads: List[StagedUpload],
+    openai_api_key: str,
+    parser: Optional[str] = None,
+    force: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield progress events for a batch of staged documents, `doc` being the
+    document's position in `uploads`:
+
+      {"event": "document", "doc": d, "filename": f, "status": "CACHE_HIT" |
+       "PARSING" | "PARSING_PROGRESS" | "SUMMARIZING" | "SUMMARIZED" | "FAILED", ...}
+      {"event": "sections" | "classified" | "summary", "doc": d, ...}
+          (the per-section events of summarize_sections_stream)
+      {"event": "batch", "documents": [...], "metrics": {...}}   (last)
+
+    Staged files are removed as soon as they are parsed.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    parse_slots = asyncio.Semaphore(max(1, BATCH_PARSE_CONCURRENCY))
+    llm_slots = asyncio.Semaphore(max(1, BATCH_LLM_CONCURRENCY))
+    results: Dict[int, Dict[str, Any]] = {}
+
+    def emit(doc: int, status: str, **data: Any) -> None:
+        events.put_nowait({
+            "event": "document", "doc": doc, "filename": uploads[doc].filename, "status": status, **data,
+        })
+
+    # 0⃣  content-addressed cache, and identical files inside the package
+    cached: Dict[int, Dict[str, Any]] = {}
+    first_of_hash: Dict[str, int] = {}
+    for doc, upload in enumerate(uploads):
+        first_of_hash.setdefault(upload.content_hash, doc)
+        if not force:
+            row = await find_summary_by_hash(db, upload.content_hash)
+            if row is not None:
+                cached[doc] = summary_payload(row, await load_summary_sections(db, row.id))
+    finished = {doc: asyncio.Event() for doc in range(len(uploads))}
+
+    async def run(doc: int, upload: StagedUpload) -> None:
+        with pipeline_trace() as trace:
+            try:
+                if doc in cached:
+                    results[doc] = {"payload": cached[doc]}
+                    emit(doc, "CACHE_HIT")
+                    return
+                original = first_of_hash[upload.content_hash]
+                if original != doc:
+                    await finished[original].wait()
+                    results[doc] = {**results[original], "duplicate_of": original}
+                    emit(doc, "SUMMARIZED" if "sections" in results[doc] else "FAILED",
+                         duplicate_of=original)
+                    return
+
+                # 1⃣  parsing
+                emit(doc, "PARSING")
+                async with parse_slots:
+                    parsed_text = await parse_document(
+                        upload.path,
+                        upload.filename,
+                        engine=parser,
+                        content_hash=upload.content_hash,
+                        progress=lambda done, total: emit(doc, "PARSING_PROGRESS", done=done, total=total),
+                    )
+                upload.cleanup()
+
+                # 2⃣  classification + summarisation on the shared LLM slots
+                emit(doc, "SUMMARIZING")
+                summaries = {}
+                ledger = SectionLedger()
+                async for event in summarize_sections_stream(
+                    parsed_text,
+                    openai_api_key=openai_api_key,
+                    debug=False,
+                    upload_id=uuid.uuid4().hex,
+                    slots=llm_slots,
+                    find_revision=None if force else revision_finder(upload.filename),
+                ):
+                    ledger.observe(event)
+                    if event["event"] == "summary":
+                        summaries[event["index"]] = {"heading": event["heading"], "summary": event["summary"]}
+                    events.put_nowait({**event, "doc": doc})
+                result_list = [summaries[i] for i in sorted(summaries)]
+                if not result_list:
+                    raise HTTPException(400, "No summary generated")
+                results[doc] = {"sections": result_list, "ledger": ledger, "metrics": trace.summary()}
+                emit(doc, "SUMMARIZED", sections=len(result_list))
+            except Exception as exc:
+                error = exc.detail if isinstance(exc, HTTPException) else str(exc)
+                results[doc] = {"error": error}
+                emit(doc, "FAILED", error=error)
+            finally:
+                upload.cleanup()
+                finished[doc].set()
+
+    with pipeline_trace() as batch_trace:
+        # tasks copy the current context, so their traces nest in batch_trace
+        all_done = asyncio.gather(*[run(doc, upload) for doc, upload in enumerate(uploads)])
+        async for event in drain_until_done(all_done, events):
+            yield event
+        all_done.result()
+
+        # 3⃣  one transaction for every newly summarized document
+        new_docs = [doc for doc in sorted(results) if "sections" in results[doc] and "duplicate_of" not in results[doc]]
+        if new_docs:
+            with stage("store"):
+                rows = await store_summaries(db, [
+                    (uploads[doc].filename, uploads[doc].content_hash, results[doc]["sections"])
+                    for doc in new_docs
+                ], [results[doc]["ledger"] for doc in new_docs])
+            for doc, row in zip(new_docs, rows):
+                results[doc]["payload"] = summary_payload(row, results[doc]["sections"])
+                if results[doc]["ledger"].revision is not None:
+                    results[doc]["payload"]["revision"] = results[doc]["ledger"].revision
+                results[doc]["payload"]["metrics"] = results[doc]["metrics"]
+
+    documents = []
+    for doc, upload in enumerate(uploads):
+        result = results[doc]
+        if "duplicate_of" in result:
+            result = {**results[result["duplicate_of"]], "duplicate_of": result["duplicate_of"]}
+        if "payload" in result:
+            entry = {**result["payload"], "cached": doc in cached}
+            if "duplicate_of" in result:
+                entry["duplicate_of"] = result["duplicate_of"]
+        else:
+            entry = {"filename": upload.filename, "error": result["error"]}
+        documents.append(entry)
+    yield {"event": "batch", "documents": documents, "metrics": batch_trace.summary()}
@@ -0,0 +1,129 @@
+# app/clients.py
+"""
+Long-lived clients for the external services, shared by every upload.
+
+Building a ChatOpenAI creates its own AsyncOpenAI and httpx connection pool,
+so constructing them per document threw away warm keep-alive connections and
+paid TCP + TLS setup again for each one. The registry holds:
+
+  * one pooled httpx.AsyncClient (connection limits from env, HTTP/2 when the
+    `h2` package is installed) behind every chat model,
+  * one ChatOpenAI per (model, temperature, api key), all on that pool,
+  * one configured LlamaParse instance.
+
+main.py opens the registry in the FastAPI lifespan and closes it on shutdown;
+code running outside the app (scripts, benchmarks) gets it lazily through
+`get_client_registry()`.
+"""
+
+import os
+import importlib.util
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+from llama_cloud_services import LlamaParse
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class ClientRegistry:
+    def __init__(
+        self,
+        max_connections: int = 32,
+        max_keepalive_connections: int = 32,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 120.0,
+        http2: Optional[bool] = None,
+    ):
+        self.http2 = _http2_available() if http2 is None else http2
+        self.http = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        self._chat_models: Dict[Tuple[str, float, str], ChatOpenAI] = {}
+        self._llama_parser: Optional[LlamaParse] = None
+
+    @classmethod
+    def from_env(cls) -> "ClientRegistry":
+        http2 = os.getenv("LLM_HTTP2", "auto")
+        return cls(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32")),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "32")),
+            keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60")),
+            timeout=float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120")),
+            http2=None if http2 == "auto" else http2 == "1",
+        )
+
+    def chat_model(self, openai_api_key: str, temperature: float = 0.0,
+                   model_name: str = "gpt-3.5-turbo") -> ChatOpenAI:
+        """Shared ChatOpenAI for these settings; retries are left to the LLM scheduler."""
+        key = (model_name, temperature, openai_api_key)
+        if key not in self._chat_models:
+            self._chat_models[key] = ChatOpenAI(
+                model_name=model_name,
+                temperature=temperature,
+                openai_api_key=openai_api_key,
+                max_retries=0,
+                http_async_client=self.http,
+            )
+        return self._chat_models[key]
+
+    def llama_parser(self, **settings) -> LlamaParse:
+        """
+        The configured LlamaParse. It runs each parse on its own event loop in
+        a worker thread, so it keeps its per-call HTTP client; what is reused
+        is the validated configuration object.
+        """
+        if self._llama_parser is None:
+            self._llama_parser = LlamaParse(**settings)
+        return self._llama_parser
+
+    async def aclose(self) -> None:
+        self._chat_models.clear()
+        await self.http.aclose()
+
+    def _open_connections(self) -> Optional[int]:
+        """
+        Connections held by the pool, or None when the transport does not
+        expose them. httpx has no public API for this, so the lookup reads
+        httpcore's pool defensively instead of trusting its internals.
+        """
+        pool = getattr(getattr(self.http, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        try:
+            return len(connections)
+        except TypeError:
+            return None
+
+    def stats(self) -> Dict[str, Optional[int] | bool]:
+        return {
+            "http2": self.http2,
+            "chat_models": len(self._chat_models),
+            "open_connections": self._open_connections(),
+        }
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def get_client_registry() -> ClientRegistry:
+    """Return the process-wide registry, creating it from env on first use."""
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry.from_env()
+    return _registry
+
+
+async def close_client_registry() -> None:
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
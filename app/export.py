@@ -0,0 +1,102 @@
+# app/export.py
+"""
+Streaming export of the summary archive, one line per section, for
+spreadsheets and BI tools (GET /summaries/export).
+
+Rows come from a server-side cursor (`AsyncSession.stream` with yield_per)
+and are encoded one fetched batch at a time, so memory stays flat no matter
+how large the archive is. Documents without sections still get one line with
+empty section fields.
+"""
+
+import io
+import os
+import csv
+import json
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy.future import select
+
+from app.database import SessionLocal, Summary, SummarySection
+from app.services import iso_utc
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+EXPORT_COLUMNS = [
+    "summary_id", "filename", "upload_time", "content_hash", "position", "heading", "summary",
+]
+
+
+def _naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """upload_time is stored as naive UTC; compare filters the same way."""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def export_query(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    filename: Optional[str] = None,
+):
+    query = (
+        select(
+            Summary.id, Summary.filename, Summary.upload_time, Summary.content_hash,
+            SummarySection.position, SummarySection.heading, SummarySection.summary,
+        )
+        .outerjoin(SummarySection, SummarySection.summary_id == Summary.id)
+        .order_by(Summary.id, SummarySection.position)
+    )
+    if since is not None:
+        query = query.where(Summary.upload_time >= _naive_utc(since))
+    if until is not None:
+        query = query.where(Summary.upload_time < _naive_utc(until))
+    if filename:
+        query = query.where(Summary.filename.ilike(f"%{filename}%"))
+    return query
+
+
+async def export_batches(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    filename: Optional[str] = None,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Export rows in fetched batches of at most `batch_rows`, in document order."""
+    async with SessionLocal() as db:
+        result = await db.stream(
+            export_query(since, until, filename).execution_options(yield_per=batch_rows))
+        async for partition in result.partitions():
+            yield [
+                {
+                    "summary_id": r.id,
+                    "filename": r.filename,
+                    "upload_time": iso_utc(r.upload_time) if r.upload_time else None,
+                    "content_hash": r.content_hash,
+                    "position": r.position,
+                    "heading": r.heading,
+                    "summary": r.summary,
+                }
+                for r in partition
+            ]
+
+
+async def ndjson_lines(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in batch)
+
+
+async def csv_lines(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    buffer.write("\ufeff")
+    writer.writeheader()
+    async for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
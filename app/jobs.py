@@ -0,0 +1,369 @@
+# app/jobs.py
+"""
+Background summarization jobs, backed by SQLite only (no external broker).
+
+  POST /jobs               -> JobManager.submit() stores the upload and a
+                              queued Job row, returns the job id
+  worker pool              -> JOB_WORKERS asyncio workers claim queued jobs,
+                              parse, summarize and store the result
+  GET /jobs/{id}/events    -> replays the JobEvent log, then follows it live
+
+Every classification verdict and section summary is checkpointed in
+job_sections as it arrives. A job interrupted by a restart (or a worker that
+stopped heartbeating) is put back in the queue and resumes from its
+checkpoints instead of starting over; the parsed markdown is kept on the job
+row so parsing is not repeated either.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+from app.database import SessionLocal, Job, JobEvent, JobSection
+from app.metrics import PipelineTrace, pipeline_trace, stage
+from app.parser import parse_document
+from app.services import (
+    find_summary_by_hash, load_summary_sections, store_summary, summary_payload,
+)
+from app.revisions import SectionLedger, revision_finder
+from app.summarization import summarize_sections_stream
+from app.uploads import StagedUpload
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobManager:
+    def __init__(
+        self,
+        openai_api_key: str,
+        workers: int = 2,
+        storage_dir: str = "./job_uploads",
+        heartbeat_seconds: float = 10.0,
+        stale_seconds: float = 60.0,
+        poll_seconds: float = 1.0,
+    ):
+        self.openai_api_key = openai_api_key
+        self.workers = max(1, workers)
+        self.storage_dir = Path(storage_dir)
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.poll_seconds = poll_seconds
+
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        # job id -> Event set whenever the job logs something new
+        self._listeners: Dict[str, asyncio.Event] = {}
+
+    @classmethod
+    def from_env(cls, openai_api_key: str) -> "JobManager":
+        return cls(
+            openai_api_key=openai_api_key,
+            workers=int(os.getenv("JOB_WORKERS", "2")),
+            storage_dir=os.getenv("JOB_STORAGE_DIR", "./job_uploads"),
+            heartbeat_seconds=float(os.getenv("JOB_HEARTBEAT_SECONDS", "10")),
+            stale_seconds=float(os.getenv("JOB_STALE_SECONDS", "60")),
+        )
+
+    # ─── lifecycle ───
+    async def start(self) -> None:
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        await self._requeue_stale()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ─── submission / queries ───
+    async def submit(self, upload: StagedUpload, parser: Optional[str] = None,
+                     force: bool = False) -> Job:
+        """Take ownership of a staged upload and queue a job for it."""
+        job_id = uuid.uuid4().hex
+        filename, content_hash = upload.filename, upload.content_hash
+        file_path = self.storage_dir / f"{job_id}{Path(filename).suffix.lower()}"
+        # a rename when the upload was staged in storage_dir
+        await asyncio.to_thread(shutil.move, upload.path, file_path)
+
+        now = _now()
+        job = Job(
+            id=job_id,
+            filename=filename,
+            content_hash=content_hash,
+            file_path=str(file_path),
+            parser=parser,
+            force=force,
+            status="queued",
+            created_at=now,
+            updated_at=now,
+        )
+        async with SessionLocal() as db:
+            db.add(job)
+            await db.commit()
+        await self._log(job_id, "status", "QUEUED")
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        async with SessionLocal() as db:
+            return await db.get(Job, job_id)
+
+    async def events(self, job_id: str, after: int = 0) -> AsyncIterator[JobEvent]:
+        """
+        Yield logged events with seq > `after`, then follow new ones until the
+        job reaches a terminal status.
+        """
+        last = after
+        while True:
+            listener = self._listeners.setdefault(job_id, asyncio.Event())
+            listener.clear()
+            async with SessionLocal() as db:
+                res = await db.execute(
+                    select(JobEvent)
+                    .where(JobEvent.job_id == job_id, JobEvent.seq > last)
+                    .order_by(JobEvent.seq)
+                )
+                new_events = res.scalars().all()
+                job = await db.get(Job, job_id)
+            for ev in new_events:
+                last = ev.seq
+                yield ev
+            if job is None or (job.status in TERMINAL_STATUSES and not new_events):
+                self._listeners.pop(job_id, None)
+                return
+            if not new_events:
+                try:
+                    # the poll timeout also picks up events from other processes
+                    await asyncio.wait_for(listener.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    # ─── internals ───
+    async def _log(self, job_id: str, event: str, data: Any) -> None:
+        async with SessionLocal() as db:
+            res = await db.execute(
+                select(JobEvent.seq)
+                .where(JobEvent.job_id == job_id)
+                .order_by(JobEvent.seq.desc())
+                .limit(1)
+            )
+            seq = (res.scalar() or 0) + 1
+            db.add(JobEvent(
+                job_id=job_id,
+                seq=seq,
+                event=event,
+                data=data if isinstance(data, str) else json.dumps(data),
+                created_at=_now(),
+            ))
+            await db.commit()
+        listener = self._listeners.get(job_id)
+        if listener is not None:
+            listener.set()
+
+    async def _set(self, job_id: str, **values) -> None:
+        async with SessionLocal() as db:
+            await db.execute(
+                update(Job).where(Job.id == job_id).values(updated_at=_now(), **values))
+            await db.commit()
+
+    async def _claim_next(self) -> Optional[str]:
+        """Atomically move the oldest queued job to running; None if idle."""
+        async with SessionLocal() as db:
+            res = await db.execute(
+                select(Job.id).where(Job.status == "queued").order_by(Job.created_at).limit(5)
+            )
+            for job_id in res.scalars().all():
+                now = _now()
+                claimed = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="running", heartbeat_at=now, updated_at=now)
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    return job_id
+        return None
+
+    async def _requeue_stale(self) -> None:
+        """
+        Put running jobs whose worker stopped heartbeating back in the queue.
+        They resume from their checkpoints.
+        """
+        cutoff = _now() - timedelta(seconds=self.stale_seconds)
+        async with SessionLocal() as db:
+            res = await db.execute(
+                update(Job)
+                .where(Job.status == "running", Job.heartbeat_at < cutoff)
+                .values(status="queued", updated_at=_now())
+            )
+            await db.commit()
+        if res.rowcount:
+            self._wakeup.set()
+
+    async def _reaper(self) -> None:
+        while True:
+            await asyncio.sleep(self.stale_seconds / 2)
+            await self._requeue_stale()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._claim_next()
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job_id)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await self._set(job_id, heartbeat_at=_now())
+            except Exception:
+                # a missed beat (e.g. "database is locked") must not end the
+                # loop, or the running job goes stale and is claimed twice
+                logger.exception("Heartbeat for job %s failed; retrying", job_id)
+
+    async def _run(self, job_id: str) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            await self._process(job_id)
+        except asyncio.CancelledError:
+            # shutting down: leave the job "running"; it is requeued once
+            # its heartbeat goes stale and resumes from its checkpoints
+            raise
+        except Exception as exc:
+            logger.exception("Job %s failed", job_id)
+            # log first: followers stop once they see a terminal status
+            await self._log(job_id, "error", {"detail": str(exc)})
+            await self._log(job_id, "status", "FAILED")
+            await self._set(job_id, status="failed", error=str(exc) or type(exc).__name__)
+            self._remove_upload(job_id)
+        finally:
+            heartbeat.cancel()
+
+    def _remove_upload(self, job_id: str) -> None:
+        for path in self.storage_dir.glob(f"{job_id}.*"):
+            path.unlink(missing_ok=True)
+
+    async def _finish(self, job_id: str, row) -> None:
+        await self._set(job_id, status="completed", summary_id=row.id, parsed_text=None)
+        self._remove_upload(job_id)
+
+    async def _process(self, job_id: str) -> None:
+        with pipeline_trace() as trace:
+            await self._process_traced(job_id, trace)
+
+    async def _process_traced(self, job_id: str, trace: PipelineTrace) -> None:
+        job = await self.get(job_id)
+
+        # 0⃣  content-addressed cache
+        if not job.force:
+            async with SessionLocal() as db:
+                cached = await find_summary_by_hash(db, job.content_hash)
+                sections = await load_summary_sections(db, cached.id) if cached else None
+            if cached is not None:
+                await self._log(job_id, "status", "CACHE_HIT")
+                await self._log(job_id, "result", summary_payload(cached, sections))
+                await self._log(job_id, "status", "COMPLETE")
+                await self._finish(job_id, cached)
+                return
+
+        # 1⃣  parsing (skipped when resuming a job that already parsed)
+        parsed_text = job.parsed_text
+        if not parsed_text:
+            await self._log(job_id, "status", "PARSING")
+            parsed_text = await parse_document(
+                job.file_path, job.filename, engine=job.parser, content_hash=job.content_hash)
+            await self._set(job_id, parsed_text=parsed_text)
+
+        # 2⃣  classification + summarisation, checkpointed per section
+        async with SessionLocal() as db:
+            res = await db.execute(select(JobSection).where(JobSection.job_id == job_id))
+            checkpoints = {
+                cp.section_index: {"heading": cp.heading, "relevant": cp.relevant, "summary": cp.summary}
+                for cp in res.scalars().all()
+            }
+        if checkpoints:
+            await self._log(job_id, "status", "RESUMING")
+
+        summaries = {}
+        ledger = SectionLedger()
+        async for event in summarize_sections_stream(
+            parsed_text,
+            openai_api_key=self.openai_api_key,
+            debug=False,
+            upload_id=job_id,
+            completed=checkpoints,
+            find_revision=None if job.force else revision_finder(job.filename),
+        ):
+            ledger.observe(event)
+            if event["event"] == "sections":
+                await self._log(job_id, "status", "IDENTIFYING_RELEVANT_SECTIONS")
+            elif event["event"] in ("classified", "summary"):
+                await self._checkpoint(job_id, event, checkpoints)
+            if event["event"] == "summary":
+                summaries[event["index"]] = {"heading": event["heading"], "summary": event["summary"]}
+            await self._log(job_id, event["event"], event)
+
+        result_list = [summaries[i] for i in sorted(summaries)]
+        if not result_list:
+            raise ValueError("No summary generated")
+
+        # 3⃣  DB storage
+        await self._log(job_id, "status", "STORING_IN_DATABASE")
+        with stage("store"):
+            async with SessionLocal() as db:
+                row = await store_summary(db, job.filename, job.content_hash, result_list, ledger)
+        payload = summary_payload(row, result_list)
+        if ledger.revision is not None:
+            payload["revision"] = ledger.revision
+        payload["metrics"] = trace.summary()
+        await self._log(job_id, "result", payload)
+        await self._log(job_id, "status", "COMPLETE")
+        await self._finish(job_id, row)
+
+    async def _checkpoint(self, job_id: str, event: Dict[str, Any], checkpoints: Dict[int, Dict]) -> None:
+        index = event["index"]
+        prior = checkpoints.get(index)
+        if prior is not None and prior.get("heading") == event["heading"]:
+            if event["event"] == "classified" and prior.get("relevant") is not None:
+                return      # replayed from an earlier run
+            if event["event"] == "summary" and prior.get("summary"):
+                return
+        async with SessionLocal() as db:
+            res = await db.execute(
+                select(JobSection).where(JobSection.job_id == job_id, JobSection.section_index == index))
+            cp = res.scalars().first()
+            if cp is None or cp.heading != event["heading"]:
+                if cp is not None:
+                    await db.delete(cp)
+                    await db.flush()
+                cp = JobSection(job_id=job_id, section_index=index, heading=event["heading"])
+                db.add(cp)
+            if event["event"] == "classified":
+                cp.relevant = event["relevant"]
+            else:
+                cp.relevant = True
+                cp.summary = event["summary"]
+            await db.commit()
@@ -0,0 +1,252 @@
+# app/llm_scheduler.py
+"""
+Process-wide scheduler for every OpenAI chat call made by the summarization
+pipeline.
+
+One instance (see `get_llm_scheduler`) is shared by all concurrent uploads:
+
+  * a global cap on in-flight requests,
+  * requests-per-minute and tokens-per-minute budgets (tokens estimated with
+    tiktoken before the call is sent),
+  * retry with full-jitter exponential backoff on 429 / 5xx / connection errors,
+  * round-robin hand-out of free slots between uploads, so one 300-page
+    document cannot starve a small one queued behind it.
+"""
+
+import os
+import time
+import random
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import tiktoken
+import openai
+
+
+DEFAULT_OWNER = "default"
+
+# Which upload the current task is working for (set by `upload_scope`).
+_current_owner: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_scheduler_owner", default=DEFAULT_OWNER
+)
+
+
+@contextmanager
+def upload_scope(owner: str):
+    """
+    Tag every LLM call made inside this block (including tasks spawned from
+    it) as belonging to `owner`, which is the unit of fairness.
+    """
+    token = _current_owner.set(owner)
+    try:
+        yield
+    finally:
+        _current_owner.reset(token)
+
+
+##############################################################################
+# Token estimation
+##############################################################################
+
+@lru_cache(maxsize=None)
+def _encoding_for(model_name: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # BPE files are downloaded on first use; offline hosts fall back below
+        return None
+
+
+def count_tokens(text: str, model_name: str = "gpt-3.5-turbo") -> int:
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        return len(text or "") // 4 + 1
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def estimate_request_tokens(messages: List[Any], model_name: str, completion_tokens: int) -> int:
+    """
+    Rough upper bound of what a chat request will bill against the TPM budget:
+    prompt tokens (+4 per message of chat framing) plus the expected completion.
+    """
+    prompt = sum(count_tokens(str(getattr(m, "content", m)), model_name) + 4 for m in messages)
+    return prompt + completion_tokens
+
+
+##############################################################################
+# Rate window (RPM + TPM)
+##############################################################################
+
+class _RateWindow:
+    """
+    Sliding 60-second window over requests and tokens already sent.
+    `reserve` waits until the new request fits inside both budgets.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, window: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._sent: Deque[Tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._sent and now - self._sent[0][0] >= self.window:
+            _, tokens = self._sent.popleft()
+            self._tokens_in_window -= tokens
+
+    async def reserve(self, tokens: int) -> None:
+        # A single request bigger than the whole TPM budget can never fit;
+        # clamp so it waits for an empty window instead of forever.
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                fits_requests = len(self._sent) < self.requests_per_minute
+                fits_tokens = self._tokens_in_window + tokens <= self.tokens_per_minute
+                if fits_requests and fits_tokens:
+                    self._sent.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                await asyncio.sleep(max(0.01, self.window - (now - self._sent[0][0])))
+
+
+##############################################################################
+# Scheduler
+##############################################################################
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        requests_per_minute: int = 3500,
+        tokens_per_minute: int = 160_000,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        completion_tokens: int = 512,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.completion_tokens = completion_tokens
+        self._rate = _RateWindow(requests_per_minute, tokens_per_minute)
+
+        self._active = 0
+        # owner -> FIFO of waiters; dict order is the round-robin order
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "3500")),
+            tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "160000")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+        )
+
+    # ─── slot hand-out (fair between owners) ───
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency and self._waiting:
+            owner, queue = next(iter(self._waiting.items()))
+            del self._waiting[owner]
+            fut = queue.popleft()
+            if queue:
+                # owner goes to the back of the line for its next request
+                self._waiting[owner] = queue
+            if fut.done():          # cancelled while waiting
+                continue
+            self._active += 1
+            fut.set_result(None)
+
+    async def _acquire(self, owner: str) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(owner, deque()).append(fut)
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was granted just before we were cancelled
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "waiting": sum(len(q) for q in self._waiting.values()),
+            "owners_waiting": len(self._waiting),
+        }
+
+    # ─── public entry point ───
+    async def invoke(self, llm, messages: List[Any], owner: Optional[str] = None):
+        """
+        Run `llm.ainvoke(messages)` under the global concurrency cap, the
+        RPM/TPM budgets and the retry policy. Returns the model's message.
+        """
+        owner = owner or _current_owner.get()
+        model_name = getattr(llm, "model_name", "gpt-3.5-turbo")
+        tokens = estimate_request_tokens(
+            messages, model_name, getattr(llm, "max_tokens", None) or self.completion_tokens
+        )
+
+        await self._acquire(owner)
+        try:
+            attempt = 0
+            while True:
+                await self._rate.reserve(tokens)
+                try:
+                    return await llm.ainvoke(messages)
+                except Exception as exc:
+                    if attempt >= self.max_retries or not _is_retryable(exc):
+                        raise
+                    delay = _retry_after(exc)
+                    if delay is None:
+                        delay = random.uniform(
+                            0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                    attempt += 1
+                    await asyncio.sleep(delay)
+        finally:
+            self._release()
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Return the process-wide scheduler, creating it from env on first use."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler.from_env()
+    return _scheduler
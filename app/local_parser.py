@@ -0,0 +1,168 @@
+# app/local_parser.py
+"""
+Offline text extraction for born-digital PDFs (pypdf) and DOCX files
+(python-docx), emitting the same markdown heading convention LlamaParse is
+prompted to produce:
+
+  * numbered lines ("1.", "2.1", "IV.", "C.3") become top-level '#' headings,
+  * other bold / heading-styled lines become '##' subsections,
+  * everything else is body text.
+
+`text_layer_quality` scores the extracted text so callers can fall back to
+LlamaParse for scanned or badly encoded documents.
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+from pypdf import PdfReader
+import docx
+from docx.table import Table
+
+from app.numbering import NUMBERED, detect_numbering
+
+# Bump when the markdown produced here changes (part of the parse-cache key)
+LOCAL_PARSER_VERSION = "1"
+
+# Lines longer than this are treated as body text even if bold / numbered
+MAX_HEADING_CHARS = 120
+
+_BOLD_FONT = re.compile(r'bold|black|heavy|semibold|demi', re.IGNORECASE)
+
+
+class LowQualityTextError(Exception):
+    """The local text layer is too sparse or garbled to be trusted."""
+
+
+def _heading_markdown(text: str, bold: bool) -> str:
+    """Render one extracted line with the markdown heading convention."""
+    # numbered list items read like sentences; headings rarely do
+    sentence_like = text.endswith((".", ",", ";")) and len(text.split()) > 6
+    if len(text) <= MAX_HEADING_CHARS and not sentence_like:
+        if detect_numbering(text) == NUMBERED:
+            return f"# {text}"
+        if bold:
+            return f"## {text}"
+    return text
+
+
+##############################################################################
+# PDF
+##############################################################################
+
+def _is_bold_font(font_dict) -> bool:
+    if not font_dict:
+        return False
+    return bool(_BOLD_FONT.search(str(font_dict.get("/BaseFont", ""))))
+
+
+def _pdf_page_lines(page) -> List[Tuple[str, bool]]:
+    """
+    Reassemble a page's text into lines, remembering whether (almost) every
+    character on the line was drawn with a bold font.
+    """
+    lines: List[Tuple[str, bool]] = []
+    current = {"text": "", "bold": 0, "total": 0}
+
+    def flush():
+        text = " ".join(current["text"].split())
+        if text:
+            is_bold = current["total"] > 0 and current["bold"] / current["total"] >= 0.8
+            lines.append((text, is_bold))
+        current.update(text="", bold=0, total=0)
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        bold = _is_bold_font(font_dict)
+        for i, part in enumerate(text.split("\n")):
+            if i > 0:
+                flush()
+            current["text"] += part
+            visible = len(part.strip())
+            current["total"] += visible
+            if bold:
+                current["bold"] += visible
+
+    page.extract_text(visitor_text=visitor)
+    flush()
+    return lines
+
+
+def pdf_page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_pdf_markdown(path: str, start_page: int = 0, end_page: int = None) -> Tuple[str, int]:
+    """
+    Extract pages [start_page, end_page) of a PDF as markdown.
+    Returns (markdown, number_of_pages_read).
+    """
+    reader = PdfReader(path)
+    pages = reader.pages[start_page:end_page]
+    out = []
+    for page in pages:
+        for text, bold in _pdf_page_lines(page):
+            out.append(_heading_markdown(text, bold))
+    return "\n".join(out), len(pages)
+
+
+##############################################################################
+# DOCX
+##############################################################################
+
+def _docx_paragraph_markdown(paragraph) -> str:
+    text = " ".join(paragraph.text.split())
+    if not text:
+        return ""
+    style = (paragraph.style.name or "") if paragraph.style is not None else ""
+    styled_heading = style.startswith("Heading") or style == "Title"
+    runs = [r for r in paragraph.runs if r.text.strip()]
+    all_bold = bool(runs) and all(r.bold for r in runs)
+    return _heading_markdown(text, styled_heading or all_bold)
+
+
+def extract_docx_markdown(path: str) -> Tuple[str, int]:
+    """
+    Extract a DOCX as markdown. Returns (markdown, pseudo_page_count), where the
+    page count is estimated from length since DOCX has no fixed pagination.
+    """
+    document = docx.Document(path)
+    out = []
+    # body order, so each table stays under the heading it belongs to
+    for block in document.iter_inner_content():
+        if isinstance(block, Table):
+            for row in block.rows:
+                cells = [" ".join(c.text.split()) for c in row.cells]
+                if any(cells):
+                    out.append("| " + " | ".join(cells) + " |")
+            continue
+        line = _docx_paragraph_markdown(block)
+        if line:
+            out.append(line)
+    markdown = "\n".join(out)
+    return markdown, max(1, len(markdown) // 3000)
+
+
+##############################################################################
+# Quality gate
+##############################################################################
+
+def text_layer_quality(text: str, pages: int) -> Dict[str, float]:
+    """
+    Cheap signals that the text layer is usable:
+      chars_per_page   – scanned PDFs have (almost) none
+      printable_ratio  – share of letters, digits, whitespace and common punctuation
+    """
+    stripped = text.strip()
+    if not stripped:
+        return {"chars_per_page": 0.0, "printable_ratio": 0.0}
+    normal = sum(1 for ch in stripped if ch.isalnum() or ch.isspace() or ch in ".,;:()[]-–—'\"/&%$#*!?")
+    return {
+        "chars_per_page": len(stripped) / max(pages, 1),
+        "printable_ratio": normal / len(stripped),
+    }
+
+
+def is_good_text_layer(text: str, pages: int, min_chars_per_page: float, min_printable_ratio: float) -> bool:
+    quality = text_layer_quality(text, pages)
+    return (quality["chars_per_page"] >= min_chars_per_page
+            and quality["printable_ratio"] >= min_printable_ratio)
@@ -1,21 +1,42 @@
 # app/main.py
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, update
 from sqlalchemy.future import select
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone
-from starlette.datastructures import UploadFile as StarletteUploadFile
-from io import BytesIO
+from datetime import datetime
+from typing import List
+from starlette.background import BackgroundTask
+import asyncio
+import base64
 import json
 import os
+import uuid
 import uvicorn
 from dotenv import load_dotenv
 
-from app.database import SessionLocal, Summary, init_db
+from app.database import DocumentSection, SessionLocal, Summary, SummarySection, init_db
+from app.services import (
+    find_summary_by_hash, iso_utc, load_summary_sections, store_summary, summary_payload,
+)
+from app.clients import close_client_registry, get_client_registry
+from app.jobs import JobManager
 from app.parser import parse_document
-from app.summarization import detect_headings_and_summarize_llm
+from app.summarization import summarize_sections_stream
+from app.streaming import drain_until_done
+from app.llm_cache import get_llm_cache
+from app.parse_cache import get_parse_cache
+from app.section_dedup import get_section_index
+from app.relevance_filter import get_relevance_filter
+from app.metrics import pipeline_trace, register_collector, render_prometheus, stage
+from app.llm_scheduler import get_llm_scheduler
+from app.search import search_available, search_summaries
+from app.uploads import stage_batch, stage_upload
+from app.batch import summarize_batch_stream
+from app.export import csv_lines, export_batches, ndjson_lines
+from app.revisions import SectionLedger, revision_finder, revision_report
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -24,21 +45,14 @@ if not OPENAI_API_KEY:
 
 
 # ─────────────────────────── helpers ───────────────────────────
-def _sse(data: str) -> str:
-    """Format a Server-Sent-Events line."""
-    return f"data: {data}\n\n"
-
-
-def iso_utc(dt: datetime) -> str:
+def _sse(data: str, event: str | None = None) -> str:
     """
-    Return an ISO-8601 string in **UTC** with a trailing Z,
-    regardless of whether the input is naive or offset-aware.
+    Format a Server-Sent-Events line. Named events (`event: ...`) carry
+    incremental JSON updates; unnamed ones are the status tokens / final payload.
     """
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    else:
-        dt = dt.astimezone(timezone.utc)
-    return dt.isoformat(timespec="seconds").replace("+00:00", "Z")
+    if event:
+        return f"event: {event}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
 
 
 async def get_db():
@@ -50,8 +64,12 @@ async def get_db():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()          # create tables once on startup
+    app.state.clients = get_client_registry()   # pooled LLM / parser clients
+    app.state.job_manager = JobManager.from_env(OPENAI_API_KEY)
+    await app.state.job_manager.start()
     yield                     # app runs
-    # no shutdown tasks needed
+    await app.state.job_manager.stop()
+    await close_client_registry()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -68,85 +86,376 @@ app.add_middleware(
 @app.post("/summarize-stream/")
 async def summarize_stream(
     file: UploadFile = File(...),
+    force: bool = False,
+    parser: str | None = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
     Streams progress tokens + final summary payload.
     Ensures the DB connection is always returned to the pool to
     avoid SAWarnings about unchecked-in connections.
+
+    Uploads are keyed by the SHA-256 of their bytes: if an identical file was
+    summarized before, the stored payload is streamed straight away unless
+    `?force=true` asks for a fresh run. `?parser=auto|local|llamaparse`
+    picks the parsing engine for this upload.
+
+    The upload is copied to a temp file in chunks and hashed on the way;
+    files over MAX_UPLOAD_BYTES are refused with 413 before anything runs.
+
+    An amended version of a stored document (app/revisions.py) only re-runs
+    its changed and added sections; the `revision` event and the final
+    payload's "revision" carry the section-level change report.
     """
-    file_bytes: bytes = await file.read()
-    filename: str = file.filename
+    upload = await stage_upload(file)
+    filename: str = upload.filename
+    content_hash = upload.content_hash
 
     async def event_generator():
         try:
-            # 1⃣  parsing
-            yield _sse("PARSING")
-            pseudo_upload = StarletteUploadFile(
-                filename=filename, file=BytesIO(file_bytes))
-            parsed_text = await parse_document(pseudo_upload)
-
-            # 2⃣  classification + summarisation
-            yield _sse("IDENTIFYING_RELEVANT_SECTIONS")
-            yield _sse("SUMMARIZING_SECTIONS")
-            result_list = await detect_headings_and_summarize_llm(
-                parsed_text, openai_api_key=OPENAI_API_KEY, debug=False
-            )
-            if not result_list:
-                raise HTTPException(400, "No summary generated")
-
-            # 3⃣  DB storage
-            yield _sse("STORING_IN_DATABASE")
-            new_row = Summary(
-                filename=filename,
-                upload_time=datetime.now(timezone.utc),
-                summary=json.dumps(result_list),
-            )
-            db.add(new_row)
-            await db.commit()
-            await db.refresh(new_row)
-
-            # 4⃣  final payload
-            payload = {
-                "id": new_row.id,
-                "filename": new_row.filename,
-                "upload_time": iso_utc(new_row.upload_time),
-                "summary": result_list,
-            }
-            yield _sse(json.dumps(payload))
-            yield _sse("COMPLETE")
+            with pipeline_trace() as trace:
+                # 0⃣  content-addressed cache
+                if not force:
+                    cached = await find_summary_by_hash(db, content_hash)
+                    if cached:
+                        yield _sse("CACHE_HIT")
+                        sections = await load_summary_sections(db, cached.id)
+                        yield _sse(json.dumps(summary_payload(cached, sections)))
+                        yield _sse("COMPLETE")
+                        return
+
+                # 1⃣  parsing
+                yield _sse("PARSING")
+                progress_events: asyncio.Queue = asyncio.Queue()
+                parse_task = asyncio.create_task(parse_document(
+                    upload.path,
+                    filename,
+                    engine=parser,
+                    content_hash=content_hash,
+                    progress=lambda done, total: progress_events.put_nowait(
+                        f"PARSING_PROGRESS {done}/{total}"),
+                ))
+                async for event in drain_until_done(parse_task, progress_events):
+                    yield _sse(event)
+                parsed_text = parse_task.result()
+                upload.cleanup()
+
+                # 2⃣  classification + summarisation, forwarded section by section
+                summaries = {}
+                summarizing = False
+                ledger = SectionLedger()
+                # every LLM call is tagged with this upload for fair scheduling
+                async for event in summarize_sections_stream(
+                    parsed_text,
+                    openai_api_key=OPENAI_API_KEY,
+                    debug=False,
+                    upload_id=uuid.uuid4().hex,
+                    find_revision=None if force else revision_finder(filename),
+                ):
+                    ledger.observe(event)
+                    if event["event"] == "sections":
+                        yield _sse("IDENTIFYING_RELEVANT_SECTIONS")
+                    elif event["event"] == "classified" and event["relevant"] and not summarizing:
+                        summarizing = True
+                        yield _sse("SUMMARIZING_SECTIONS")
+                    elif event["event"] == "summary":
+                        summaries[event["index"]] = {
+                            "heading": event["heading"],
+                            "summary": event["summary"],
+                        }
+                    yield _sse(json.dumps(event), event=event["event"])
+                result_list = [summaries[i] for i in sorted(summaries)]
+                if not result_list:
+                    raise HTTPException(400, "No summary generated")
+
+                # 3⃣  DB storage
+                yield _sse("STORING_IN_DATABASE")
+                with stage("store"):
+                    new_row = await store_summary(db, filename, content_hash, result_list, ledger)
+
+                # 4⃣  final payload, with this upload's timings / tokens / cost
+                payload = summary_payload(new_row, result_list)
+                if ledger.revision is not None:
+                    payload["revision"] = ledger.revision
+                payload["metrics"] = trace.summary()
+                yield _sse(json.dumps(payload))
+                yield _sse("COMPLETE")
         finally:
             # make sure pooled connection is returned
             await db.close()
+            upload.cleanup()
+
+    # cleanup also runs as a background task in case the stream never starts
+    return StreamingResponse(event_generator(), media_type="text/event-stream",
+                             background=BackgroundTask(upload.cleanup))
+
+
+# ─────────────────────────── /summarize-batch/ ───────────────────────────
+@app.post("/summarize-batch/")
+async def summarize_batch(
+    files: List[UploadFile] = File(...),
+    force: bool = False,
+    parser: str | None = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Summarize a whole solicitation package: several PDF/DOC/DOCX files and/or
+    ZIP archives of them. Documents are parsed concurrently and share one LLM
+    concurrency budget (see app/batch.py).
+
+    Streams named `document` events (per-document status) and the usual
+    `sections` / `classified` / `summary` events tagged with `doc`, then the
+    final payload {"documents": [...], "metrics": ...} and COMPLETE.
+    """
+    uploads = await stage_batch(files)
+
+    def cleanup():
+        for upload in uploads:
+            upload.cleanup()
+
+    async def event_generator():
+        try:
+            yield _sse(json.dumps({
+                "count": len(uploads), "filenames": [u.filename for u in uploads],
+            }), event="batch")
+            async for event in summarize_batch_stream(
+                db, uploads, OPENAI_API_KEY, parser=parser, force=force,
+            ):
+                if event["event"] == "batch":
+                    yield _sse(json.dumps({"documents": event["documents"], "metrics": event["metrics"]}))
+                    yield _sse("COMPLETE")
+                else:
+                    yield _sse(json.dumps(event), event=event["event"])
+        finally:
+            await db.close()
+            cleanup()
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream",
+                             background=BackgroundTask(cleanup))
+
+
+# ─────────────────────────── background jobs ───────────────────────────
+def _job_status(job) -> dict:
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "error": job.error,
+        "summary_id": job.summary_id,
+        "created_at": iso_utc(job.created_at),
+        "updated_at": iso_utc(job.updated_at),
+    }
+
+
+@app.post("/jobs")
+async def create_job(
+    request: Request,
+    file: UploadFile = File(...),
+    force: bool = False,
+    parser: str | None = None,
+):
+    """
+    Queue an upload for background summarization. The work survives the
+    HTTP connection; follow it with GET /jobs/{id}/events.
+    """
+    manager = request.app.state.job_manager
+    # staged straight into the job store, so submit() only renames it
+    upload = await stage_upload(file, directory=str(manager.storage_dir))
+    try:
+        job = await manager.submit(upload, parser=parser, force=force)
+    except BaseException:
+        upload.cleanup()
+        raise
+    return _job_status(job)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request):
+    job = await request.app.state.job_manager.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return _job_status(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    request: Request,
+    after: int = 0,
+    last_event_id: str | None = Header(default=None),
+):
+    """
+    Replay a job's progress log, then stream new events until it finishes.
+    Reconnecting clients resume with `?after=<seq>` or the standard
+    Last-Event-ID header.
+    """
+    manager = request.app.state.job_manager
+    if not await manager.get(job_id):
+        raise HTTPException(404, "Job not found")
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    async def event_generator():
+        async for ev in manager.events(job_id, after=after):
+            yield f"id: {ev.seq}\n" + _sse(ev.data, event=ev.event)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
 # ─────────────────────────── CRUD routes ───────────────────────────
+def _encode_cursor(upload_time: datetime, row_id: int) -> str:
+    raw = f"{upload_time.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        upload_time, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(upload_time), int(row_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def _encode_offset(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode()).decode()
+
+
+def _decode_offset(cursor: str) -> int:
+    try:
+        tag, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if tag != "offset":
+            raise ValueError(tag)
+        return int(offset)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+
+async def _load_headings(db: AsyncSession, ids: list[int]) -> dict[int, list[str]]:
+    """Section headings per document, for the list preview."""
+    headings: dict[int, list[str]] = {i: [] for i in ids}
+    if ids:
+        res = await db.execute(
+            select(SummarySection.summary_id, SummarySection.heading)
+            .where(SummarySection.summary_id.in_(ids))
+            .order_by(SummarySection.summary_id, SummarySection.position)
+        )
+        for summary_id, heading in res.all():
+            headings[summary_id].append(heading)
+    return headings
+
+
 @app.get("/summaries/")
-async def get_summaries(db: AsyncSession = Depends(get_db), search: str | None = None):
-    query = select(Summary)
+async def get_summaries(
+    db: AsyncSession = Depends(get_db),
+    search: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+):
+    """
+    Page of stored documents without their summary bodies. Pass the returned
+    `next_cursor` back as `?cursor=` for the next page.
+
+    Without `search`: newest first (keyset pagination on upload_time, id).
+    With `search`: best full-text match first, each item carrying a `score`
+    and highlighted `matches` snippets.
+    """
+    if search and search_available():
+        offset = _decode_offset(cursor) if cursor else 0
+        hits, has_more = await search_summaries(db, search, limit, offset)
+        headings = await _load_headings(db, [h["id"] for h in hits])
+        return {
+            "items": [
+                {
+                    **hit,
+                    "upload_time": iso_utc(hit["upload_time"]),
+                    "section_count": len(headings[hit["id"]]),
+                    "headings": headings[hit["id"]],
+                }
+                for hit in hits
+            ],
+            "next_cursor": _encode_offset(offset + limit) if has_more else None,
+        }
+
+    query = select(
+        Summary.id, Summary.filename, Summary.upload_time
+    ).order_by(Summary.upload_time.desc(), Summary.id.desc())
     if search:
+        # no FTS5 in this SQLite build
+        matching_sections = select(SummarySection.summary_id).where(
+            SummarySection.heading.ilike(f"%{search}%") |
+            SummarySection.summary.ilike(f"%{search}%")
+        )
+        query = query.where(
+            Summary.filename.ilike(f"%{search}%") |
+            Summary.id.in_(matching_sections)
+        )
+    if cursor:
+        upload_time, row_id = _decode_cursor(cursor)
         query = query.where(
-            (Summary.filename.ilike(f"%{search}%")) |
-            (Summary.summary.ilike(f"%{search}%"))
+            (Summary.upload_time < upload_time) |
+            ((Summary.upload_time == upload_time) & (Summary.id < row_id))
         )
-    res = await db.execute(query)
-    rows = res.scalars().all()
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    headings = await _load_headings(db, [r.id for r in rows])
+
+    return {
+        "items": [
+            {
+                "id": r.id,
+                "filename": r.filename,
+                "upload_time": iso_utc(r.upload_time),
+                "section_count": len(headings[r.id]),
+                "headings": headings[r.id],
+            }
+            for r in rows
+        ],
+        "next_cursor": _encode_cursor(rows[-1].upload_time, rows[-1].id) if has_more else None,
+    }
 
-    output = []
-    for r in rows:
-        try:
-            summary_list = json.loads(r.summary)
-        except json.JSONDecodeError:
-            summary_list = r.summary
-        output.append({
-            "id": r.id,
-            "filename": r.filename,
-            "upload_time": iso_utc(r.upload_time),
-            "summary": summary_list,
-        })
-    return output
+
+@app.get("/summaries/export")
+async def export_summaries(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    filename: str | None = None,
+):
+    """
+    Stream the archive as NDJSON or CSV, one line per section (see
+    app/export.py). `since` / `until` bound upload_time (ISO-8601, `until`
+    exclusive); `filename` matches a substring, case-insensitively.
+    """
+    batches = export_batches(since, until, filename)
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    if format == "csv":
+        body, media_type = csv_lines(batches), "text/csv; charset=utf-8"
+    else:
+        body, media_type = ndjson_lines(batches), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="summaries-{stamp}.{format}"'},
+    )
+
+
+@app.get("/summaries/{summary_id}")
+async def get_summary(summary_id: int, db: AsyncSession = Depends(get_db)):
+    """One stored document with all of its section summaries."""
+    row = await db.get(Summary, summary_id)
+    if not row:
+        raise HTTPException(404, "Summary not found")
+    return summary_payload(row, await load_summary_sections(db, summary_id))
+
+
+@app.get("/summaries/{summary_id}/changes")
+async def get_summary_changes(summary_id: int, db: AsyncSession = Depends(get_db)):
+    """Section-level change report of a stored revision against its base document."""
+    report = await revision_report(db, summary_id)
+    if report is None:
+        raise HTTPException(404, "Summary not found or not a revision of a stored document")
+    return report
 
 
 @app.delete("/summaries/{summary_id}")
@@ -155,16 +464,94 @@ async def delete_summary(summary_id: int, db: AsyncSession = Depends(get_db)):
     row = res.scalars().first()
     if not row:
         raise HTTPException(404, "Summary not found")
+    await db.execute(delete(SummarySection).where(SummarySection.summary_id == summary_id))
+    await db.execute(delete(DocumentSection).where(DocumentSection.summary_id == summary_id))
+    await db.execute(update(Summary).where(Summary.base_id == summary_id).values(base_id=None))
     await db.delete(row)
     await db.commit()
     return {"message": "Summary deleted"}
 
 
 @app.get("/document-exists/{filename}")
-async def check_document_exists(filename: str, db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(Summary).where(Summary.filename == filename))
+async def check_document_exists(
+    filename: str,
+    content_hash: str | None = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Look a document up by the SHA-256 of its bytes when `content_hash` is
+    given (catches renamed copies), otherwise by filename.
+    """
+    if content_hash:
+        query = select(Summary).where(Summary.content_hash == content_hash.lower())
+    else:
+        query = select(Summary).where(Summary.filename == filename)
+    res = await db.execute(query.limit(1))
     row = res.scalars().first()
-    return {"exists": row is not None, "id": row.id if row else None}
+    return {
+        "exists": row is not None,
+        "id": row.id if row else None,
+        "match": ("content" if content_hash else "filename") if row else None,
+    }
+
+
+# ─────────────────────────── diagnostics ───────────────────────────
+def _stats_of(get_component):
+    def collect():
+        component = get_component()
+        return component.stats() if component is not None else None
+    return collect
+
+
+# component stats exported as gauges on /metrics
+register_collector("llm_cache", _stats_of(get_llm_cache))
+register_collector("parse_cache", _stats_of(get_parse_cache))
+register_collector("section_index", _stats_of(get_section_index))
+register_collector("llm_scheduler", _stats_of(get_llm_scheduler))
+register_collector("llm_http", _stats_of(get_client_registry))
+register_collector("relevance_filter", _stats_of(get_relevance_filter))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of stage timings, LLM usage and cache stats."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/llm-cache/stats")
+async def llm_cache_stats():
+    """Hit/miss counters for the persistent LLM response cache."""
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/parse-cache/stats")
+async def parse_cache_stats():
+    """Hit/miss counters and size of the parsed-markdown store."""
+    cache = get_parse_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/section-index/stats")
+async def section_index_stats():
+    """Hit/miss counters for near-duplicate section reuse."""
+    index = get_section_index()
+    if index is None:
+        return {"enabled": False}
+    return {"enabled": True, **index.stats()}
+
+
+@app.get("/relevance-filter/stats")
+async def relevance_filter_stats():
+    """How many sections the local pre-filter settled, and how often it agreed with the LLM."""
+    relevance_filter = get_relevance_filter()
+    if relevance_filter is None:
+        return {"enabled": False}
+    return {"enabled": True, **relevance_filter.stats()}
 
 
 # ─────────────────────────── run (dev) ───────────────────────────
@@ -0,0 +1,312 @@
+# app/metrics.py
+"""
+Process-wide instrumentation for the parse -> summarize -> store pipeline.
+
+  stage("parse")           times a pipeline stage (parse, refine, classify,
+                           summarize, enforce, store)
+  record_llm_call(...)     one chat completion: latency, prompt / completion
+                           tokens, cost, whether the response cache answered
+  pipeline_trace()         collects the spans and LLM calls of one upload so
+                           the totals can be attached to its final payload
+  record_speculation(...)  a speculative summary used or cancelled
+
+Everything is also aggregated into counters / histograms rendered in the
+Prometheus text format by `render_prometheus()` (GET /metrics). Spans and
+calls find the active trace through a contextvar, so tasks spawned while a
+trace is active report into it too.
+"""
+
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# USD per 1K tokens: (prompt, completion)
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def llm_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+##############################################################################
+# Aggregates (Prometheus)
+##############################################################################
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(key)} {_number(value)}")
+        return lines
+
+
+class _Histogram:
+    def __init__(self, name: str, help_text: str, buckets=_SECONDS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count], sum
+        self.values: Dict[LabelKey, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+        counts[bisect_left(self.buckets, value)] += 1
+        self.values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return lines
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in key
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+_lock = threading.Lock()
+
+STAGE_SECONDS = _Histogram("pipeline_stage_seconds", "Time spent in each pipeline stage.")
+STAGE_ERRORS = _Counter("pipeline_stage_errors_total", "Pipeline stages that raised.")
+LLM_SECONDS = _Histogram("llm_request_seconds", "Latency of chat completions, including scheduler wait.")
+LLM_REQUESTS = _Counter("llm_requests_total", "Chat completions by model, stage and cache result.")
+LLM_TOKENS = _Counter("llm_tokens_total", "Prompt and completion tokens sent to the model.")
+LLM_COST = _Counter("llm_cost_usd_total", "Estimated spend on chat completions in USD.")
+SPECULATIONS = _Counter("speculative_summaries_total", "Speculative section summaries by outcome.")
+SPECULATION_SAVED = _Counter("speculative_seconds_saved_total", "Section latency saved by speculative summaries.")
+SPECULATION_WASTED = _Counter("speculative_tokens_wasted_total", "Tokens spent on cancelled speculative summaries.")
+
+_METRICS = [
+    STAGE_SECONDS, STAGE_ERRORS, LLM_SECONDS, LLM_REQUESTS, LLM_TOKENS, LLM_COST,
+    SPECULATIONS, SPECULATION_SAVED, SPECULATION_WASTED,
+]
+
+# name -> callable returning a stats() dict, e.g. the caches (see main.py)
+_collectors: Dict[str, Callable[[], Optional[Dict[str, Any]]]] = {}
+
+
+def register_collector(name: str, collect: Callable[[], Optional[Dict[str, Any]]]) -> None:
+    """
+    Export the numeric fields of `collect()` (a component's stats() dict) as
+    `<name>_<field>` gauges. `collect` may return None when disabled.
+    """
+    _collectors[name] = collect
+
+
+def render_prometheus() -> str:
+    with _lock:
+        lines: List[str] = []
+        for metric in _METRICS:
+            lines.extend(metric.render())
+    for name, collect in sorted(_collectors.items()):
+        stats = collect() or {}
+        for field, value in sorted(stats.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f"{name}_{field}"
+            lines.extend([f"# TYPE {metric} gauge", f"{metric} {_number(value)}"])
+    return "\n".join(lines) + "\n"
+
+
+##############################################################################
+# Per-upload trace
+##############################################################################
+
+def quantile(values: List[float], q: float) -> float:
+    """Nearest-rank quantile of `values` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+class PipelineTrace:
+    """
+    Spans and LLM calls of one upload / job. A trace opened while another is
+    active also reports into the enclosing one, so a caller can aggregate
+    several uploads (see benchmarks/bench_pipeline.py).
+    """
+
+    def __init__(self, parent: Optional["PipelineTrace"] = None):
+        self.parent = parent
+        self.started = time.perf_counter()
+        # stage -> span durations in seconds
+        self.stages: Dict[str, List[float]] = {}
+        self.llm = {
+            "calls": 0, "cached_calls": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+            "cost_usd": 0.0, "latency_seconds": 0.0,
+        }
+        self.speculation = {"used": 0, "cancelled": 0, "seconds_saved": 0.0, "tokens_wasted": 0}
+
+    def _chain(self) -> Iterator["PipelineTrace"]:
+        trace = self
+        while trace is not None:
+            yield trace
+            trace = trace.parent
+
+    def add_span(self, name: str, seconds: float) -> None:
+        for trace in self._chain():
+            trace.stages.setdefault(name, []).append(seconds)
+
+    def add_llm_call(self, seconds: float, prompt_tokens: int, completion_tokens: int,
+                     cost: float, cached: bool) -> None:
+        for trace in self._chain():
+            trace.llm["calls"] += 1
+            if cached:
+                trace.llm["cached_calls"] += 1
+                continue
+            trace.llm["prompt_tokens"] += prompt_tokens
+            trace.llm["completion_tokens"] += completion_tokens
+            trace.llm["cost_usd"] += cost
+            trace.llm["latency_seconds"] += seconds
+
+    def add_speculation(self, used: bool, seconds_saved: float, tokens_wasted: int) -> None:
+        for trace in self._chain():
+            trace.speculation["used" if used else "cancelled"] += 1
+            trace.speculation["seconds_saved"] += seconds_saved
+            trace.speculation["tokens_wasted"] += tokens_wasted
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Totals for the final payload. Stage seconds are summed over all spans
+        of that stage, so concurrent sections can add up to more than the
+        wall time; p50 / p95 are per span.
+        """
+        llm = dict(self.llm)
+        llm["cost_usd"] = round(llm["cost_usd"], 6)
+        llm["latency_seconds"] = round(llm["latency_seconds"], 3)
+        summary = {
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "stages": {
+                name: {
+                    "count": len(spans),
+                    "seconds": round(sum(spans), 3),
+                    "p50": round(quantile(spans, 0.5), 3),
+                    "p95": round(quantile(spans, 0.95), 3),
+                }
+                for name, spans in self.stages.items()
+            },
+            "llm": llm,
+        }
+        if self.speculation["used"] or self.speculation["cancelled"]:
+            summary["speculation"] = {
+                **self.speculation, "seconds_saved": round(self.speculation["seconds_saved"], 3),
+            }
+        return summary
+
+
+_current_trace: contextvars.ContextVar[Optional[PipelineTrace]] = contextvars.ContextVar(
+    "pipeline_trace", default=None)
+_current_stage: contextvars.ContextVar[str] = contextvars.ContextVar("pipeline_stage", default="other")
+
+
+@contextmanager
+def pipeline_trace() -> Iterator[PipelineTrace]:
+    trace = PipelineTrace(parent=_current_trace.get())
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            pass    # async generator finalized from another context
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as one span of pipeline stage `name`."""
+    token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        with _lock:
+            STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_stage.reset(token)
+        with _lock:
+            STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, elapsed)
+
+
+def record_llm_call(model_name: str, seconds: float, prompt_tokens: int,
+                    completion_tokens: int, cached: bool) -> None:
+    """One chat completion, attributed to the innermost active stage."""
+    stage_name = _current_stage.get()
+    cost = 0.0 if cached else llm_cost(model_name, prompt_tokens, completion_tokens)
+    with _lock:
+        LLM_REQUESTS.inc(model=model_name, stage=stage_name, cache="hit" if cached else "miss")
+        if not cached:
+            LLM_SECONDS.observe(seconds, model=model_name, stage=stage_name)
+            LLM_TOKENS.inc(prompt_tokens, model=model_name, kind="prompt")
+            LLM_TOKENS.inc(completion_tokens, model=model_name, kind="completion")
+            LLM_COST.inc(cost, model=model_name)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm_call(seconds, prompt_tokens, completion_tokens, cost, cached)
+
+
+def record_speculation(used: bool, seconds_saved: float, tokens_wasted: int) -> None:
+    """
+    Outcome of one speculative section summary: used (the section came back
+    RELEVANT; `seconds_saved` of its latency overlapped classification) or
+    cancelled (IRRELEVANT; `tokens_wasted` is the prompt and completion tokens
+    of the calls that completed plus the prompt tokens of those still in
+    flight when it was cancelled).
+    """
+    with _lock:
+        SPECULATIONS.inc(outcome="used" if used else "cancelled")
+        SPECULATION_SAVED.inc(seconds_saved)
+        SPECULATION_WASTED.inc(tokens_wasted)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_speculation(used, seconds_saved, tokens_wasted)
@@ -0,0 +1,119 @@
+# app/numbering.py
+"""
+Local (no-LLM) detector for numbered heading text.
+
+`parse_markdown_headings` marks every '#' line as a heading; only the ones
+whose text starts with a numbering scheme are real section starts. This
+module decides that with regexes for the schemes seen in solicitations:
+
+    Arabic          "1.", "3)", "7 Scope"
+    dotted-decimal  "2.1", "2.1.3.", "1.0"
+    Roman numerals  "IV.", "XIV Scope", "(iii)"
+    lettered        "A.", "C.3.1", "(b)", "a)"
+
+optionally preceded by "Section", "Part", "Article", "Attachment", etc.
+After such a keyword a bare label is enough ("Part II", "Section B
+Supplies", "SECTION C - DESCRIPTION"), and a heading that is only a Roman
+numeral ("XIV") counts as numbered. Lines it cannot decide with confidence come back as AMBIGUOUS so the caller
+can ask the LLM about just those.
+"""
+
+import re
+from typing import Optional, Tuple
+
+NUMBERED = "NUMBERED"
+UNNUMBERED = "UNNUMBERED"
+AMBIGUOUS = "AMBIGUOUS"
+
+# Markdown emphasis / stray punctuation that can wrap the heading text
+_LEADING_NOISE = re.compile(r'^[\s*_`>~]+')
+
+# "Section C.3", "PART II", "Article 4", "Attachment J-1" ...
+_KEYWORD_PREFIX = re.compile(
+    r'^(section|sec\.|part|article|attachment|appendix|exhibit|annex|chapter|task|clause)\s+',
+    re.IGNORECASE,
+)
+
+_ROMAN = r'M{0,3}(?:CM|CD|D?C{0,3})(?:XC|XL|L?X{0,3})(?:IX|IV|V?I{0,3})'
+
+# "2.1", "2.1.3.", "1.0" – two or more numeric groups
+_DOTTED_DECIMAL = re.compile(r'^\d{1,3}(?:\.\d{1,3})+\.?(?=\s|$|[:\-–—)])')
+# "1.", "1)", "1:" – single number with a terminator
+_ARABIC_PUNCT = re.compile(r'^\(?\d{1,3}[.):](?=\s|$)')
+# "1 Scope" – bare number followed by a word
+_ARABIC_BARE = re.compile(r'^(\d+)\s+\S')
+# "C.3", "C.3.1", "J-1" – letter followed by numeric groups
+_LETTER_DOTTED = re.compile(r'^[A-Z][.\-]\d{1,3}(?:\.\d{1,3})*\.?(?=\s|$|[:\-–—)])')
+# "A.", "B)", "(c)", "d)"
+_LETTER_PUNCT = re.compile(r'^(?:\([A-Za-z]\)|[A-Za-z][.)])(?=\s|$)')
+# "IV.", "XIV)", "(iii)"
+_ROMAN_PUNCT = re.compile(rf'^\(?(?=[MDCLXVI])({_ROMAN})[.):](?=\s|$)')
+_ROMAN_PUNCT_LOWER = re.compile(r'^\((?=[mdclxvi])(m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3}))\)(?=\s|$)')
+# "XIV Scope" – bare numeral followed by a word
+_ROMAN_BARE = re.compile(rf'^(?=[MDCLXVI])({_ROMAN})\s+\S')
+# "XIV" – the whole heading is a numeral
+_ROMAN_ONLY = re.compile(rf'^(?=[MDCLXVI])({_ROMAN})$')
+# Label after a keyword: "Part II", "Section B Supplies", "Article 4", "SECTION C - ..."
+_KEYWORD_LABEL = re.compile(rf'^(?:(?=[MDCLXVI]){_ROMAN}|[A-Z]|\d{{1,2}})(?=\s|$|[.:\-–—)])')
+
+# Bare numerals that are also common words / abbreviations in headings
+_ROMAN_LOOKALIKES = {"I", "C", "D", "L", "M", "DC", "CD", "MD", "CM", "MM", "DI", "LI", "MI", "MIX", "CIV", "DIV", "MID", "LID"}
+
+
+def _strip(text: str) -> Tuple[str, bool]:
+    """Heading text without noise and keyword prefix, and whether it had one."""
+    text = _LEADING_NOISE.sub("", text or "")
+    stripped = _KEYWORD_PREFIX.sub("", text, count=1).strip()
+    return stripped, stripped != text.strip()
+
+
+def detect_numbering(heading_text: str) -> str:
+    """
+    Classify heading text as NUMBERED, UNNUMBERED or AMBIGUOUS.
+
+    >>> [detect_numbering(h) for h in ("XIV", "IV", "Part II", "Article IV")]
+    ['NUMBERED', 'NUMBERED', 'NUMBERED', 'NUMBERED']
+    >>> [detect_numbering(h) for h in ("Section B Supplies", "SECTION C - DESCRIPTION", "Part I")]
+    ['NUMBERED', 'NUMBERED', 'NUMBERED']
+    >>> [detect_numbering(h) for h in ("I", "MD", "Section 508 Compliance", "Task Order Overview")]
+    ['AMBIGUOUS', 'AMBIGUOUS', 'AMBIGUOUS', 'UNNUMBERED']
+    """
+    text, had_keyword = _strip(heading_text)
+    if not text:
+        return UNNUMBERED
+
+    if had_keyword and _KEYWORD_LABEL.match(text):
+        return NUMBERED
+
+    if (_DOTTED_DECIMAL.match(text) or _ARABIC_PUNCT.match(text)
+            or _LETTER_DOTTED.match(text) or _LETTER_PUNCT.match(text)
+            or _ROMAN_PUNCT.match(text) or _ROMAN_PUNCT_LOWER.match(text)):
+        return NUMBERED
+
+    bare = _ARABIC_BARE.match(text)
+    if bare:
+        # "3 Deliverables" is numbered; "508 Compliance" / "2024 Update" may not be
+        return NUMBERED if len(bare.group(1)) <= 2 else AMBIGUOUS
+
+    roman = _ROMAN_BARE.match(text) or _ROMAN_ONLY.match(text)
+    if roman:
+        return AMBIGUOUS if roman.group(1) in _ROMAN_LOOKALIKES else NUMBERED
+
+    first = text[0]
+    if first.isalpha():
+        # Starts with an ordinary word: "Scope of Work", "A Scope Overview"
+        if len(text) > 1 and text[1] == " " and first in "AI":
+            # a lone article/pronoun could also be an unpunctuated label
+            return AMBIGUOUS
+        return UNNUMBERED
+
+    # Bullets, symbols, stray digits with odd punctuation, etc.
+    return AMBIGUOUS
+
+
+def is_numbered(heading_text: str) -> Optional[bool]:
+    """True / False when the local rules are confident, None when ambiguous."""
+    verdict = detect_numbering(heading_text)
+    if verdict == AMBIGUOUS:
+        return None
+    return verdict == NUMBERED
@@ -0,0 +1,137 @@
+# app/parse_cache.py
+"""
+Persistent store of parsed markdown, keyed by the SHA-256 of the uploaded
+bytes plus a fingerprint of the parser settings (mode, system prompts, ...).
+
+Re-uploads and re-summarizations with changed summarization prompts skip the
+remote parse entirely; changing the parser prompts changes the key, so stale
+markdown is never served. The store is capped in bytes and evicts the
+least-recently-used documents first.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+
+def parse_cache_key(content_hash: str, settings_fingerprint: str) -> str:
+    return hashlib.sha256(f"{content_hash}:{settings_fingerprint}".encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    def __init__(self, path: str, max_bytes: int = 500 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parse_cache (
+                key TEXT PRIMARY KEY,
+                markdown TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_parse_cache_last_access ON parse_cache (last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "ParseCache":
+        return cls(
+            path=os.getenv("PARSE_CACHE_PATH", "./parse_cache.db"),
+            max_bytes=int(os.getenv("PARSE_CACHE_MAX_BYTES", str(500 * 1024 * 1024))),
+        )
+
+    # ─── sync primitives (run in a worker thread) ───
+    def _get_sync(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT markdown FROM parse_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE parse_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def _put_sync(self, key: str, markdown: str) -> None:
+        now = time.time()
+        size = len(markdown.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (key, markdown, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, markdown, size, now, now),
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM parse_cache").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM parse_cache ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    # ─── async API ───
+    async def get(self, key: str) -> Optional[str]:
+        markdown = await asyncio.to_thread(self._get_sync, key)
+        if markdown is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return markdown
+
+    async def put(self, key: str, markdown: str) -> None:
+        await asyncio.to_thread(self._put_sync, key, markdown)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM parse_cache").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+
+_cache: Optional[ParseCache] = None
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """
+    Return the process-wide parse cache, or None when disabled with
+    PARSE_CACHE_ENABLED=0.
+    """
+    global _cache
+    if os.getenv("PARSE_CACHE_ENABLED", "1") == "0":
+        return None
+    if _cache is None:
+        _cache = ParseCache.from_env()
+    return _cache
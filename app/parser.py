@@ -1,41 +1,104 @@
 # app/parser.py
 
 import os
+import json
+import asyncio
+import hashlib
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from fastapi import UploadFile, HTTPException
+from typing import Callable, List, Optional, Tuple
+from fastapi import HTTPException
 from dotenv import load_dotenv
 from llama_index.core import SimpleDirectoryReader
 from llama_cloud_services import LlamaParse
+from pypdf import PdfReader, PdfWriter
 from starlette.concurrency import run_in_threadpool
 
+from app.clients import get_client_registry
+from app.metrics import stage
+from app.parse_cache import get_parse_cache, parse_cache_key
+from app.uploads import hash_file
+from app.local_parser import (
+    LOCAL_PARSER_VERSION,
+    LowQualityTextError,
+    extract_docx_markdown,
+    extract_pdf_markdown,
+    is_good_text_layer,
+    pdf_page_count,
+)
+
 load_dotenv()
 
 
-def get_llama_parser():
+# Every setting that influences the markdown LlamaParse produces; also hashed
+# into the parse-cache key so changing a prompt invalidates cached output.
+LLAMA_PARSE_SETTINGS = dict(
+    result_type="markdown",
+    parse_mode="parse_page_with_layout_agent",
+    html_remove_navigation_elements=True,
+    preserve_layout_alignment_across_pages=True,
+    extract_layout=True,
+    system_prompt=""" 
+        Items which look like document titles, dates, table of contents, etc should be completely eliminated from the output.
+        Only output section, subsection, subsubsection, etc -titles, narrative text, list elements, and table elements.
+        Be sure to capture to the best of your ability the differences between section titles and subsection titles and denote this in markdown.
+        Key remark: all top level headings (i.e., single # in markdown) will be those that start with a number followed by either a period or a period and a zero.
+    """,
+    system_prompt_append="""
+        Though not a rigid rule, bold text is a better litmus test to deem a line (or lines) as section headers rather than capitalization 
+        at the beginning of a page, though section headers/titles often are capitalized. 
+        Remain "page number agnostic" when deciding on section titles.
+        Also elements which look like section titles but are not numbered, should be rendered as subsections.
+    """,
+)
+
+
+def get_llama_parser() -> LlamaParse:
     """
-    Utility to create the LlamaParse() object with any custom settings/prompts.
+    The process-wide LlamaParse() object with our custom settings/prompts
+    (held by the client registry, built once).
     """
-    parser = LlamaParse(
-        result_type="markdown",
-        parse_mode="parse_page_with_layout_agent",
-        html_remove_navigation_elements=True,
-        preserve_layout_alignment_across_pages=True,
-        extract_layout=True,
-        system_prompt=""" 
-            Items which look like document titles, dates, table of contents, etc should be completely eliminated from the output.
-            Only output section, subsection, subsubsection, etc -titles, narrative text, list elements, and table elements.
-            Be sure to capture to the best of your ability the differences between section titles and subsection titles and denote this in markdown.
-            Key remark: all top level headings (i.e., single # in markdown) will be those that start with a number followed by either a period or a period and a zero.
-        """,
-        system_prompt_append="""
-            Though not a rigid rule, bold text is a better litmus test to deem a line (or lines) as section headers rather than capitalization 
-            at the beginning of a page, though section headers/titles often are capitalized. 
-            Remain "page number agnostic" when deciding on section titles.
-            Also elements which look like section titles but are not numbered, should be rendered as subsections.
-        """
-    )
-    return parser
+    return get_client_registry().llama_parser(**LLAMA_PARSE_SETTINGS)
+
+
+# Local engine: below these the text layer is considered poor (scanned,
+# image-only or garbled) and "auto" falls back to LlamaParse
+LOCAL_MIN_CHARS_PER_PAGE = float(os.getenv("LOCAL_PARSE_MIN_CHARS_PER_PAGE", "200"))
+LOCAL_MIN_PRINTABLE_RATIO = float(os.getenv("LOCAL_PARSE_MIN_PRINTABLE_RATIO", "0.9"))
+
+# Engine used when a request does not pick one: "llamaparse", "local" or
+# "auto". Local-first parsing is opt-in, per request or with PARSER_ENGINE=auto
+DEFAULT_PARSER_ENGINE = os.getenv("PARSER_ENGINE", "llamaparse")
+
+# PDFs with at least this many pages are split into page ranges parsed
+# concurrently (process pool for local extraction, parallel remote jobs)
+PARSE_PARALLEL_MIN_PAGES = int(os.getenv("PARSE_PARALLEL_MIN_PAGES", "60"))
+PARSE_PAGES_PER_RANGE = int(os.getenv("PARSE_PAGES_PER_RANGE", "25"))
+PARSE_MAX_WORKERS = int(os.getenv("PARSE_MAX_WORKERS", str(os.cpu_count() or 2)))
+PARSE_MAX_REMOTE_JOBS = int(os.getenv("PARSE_MAX_REMOTE_JOBS", "4"))
+
+# Called as progress(completed_ranges, total_ranges) while a document parses
+ProgressCallback = Callable[[int, int], None]
+
+
+def parser_settings_fingerprint(engine: str = "llamaparse") -> str:
+    """Stable hash of the parser configuration, used in parse-cache keys."""
+    settings = {
+        "engine": engine,
+        "parallel_min_pages": PARSE_PARALLEL_MIN_PAGES,
+        "pages_per_range": PARSE_PAGES_PER_RANGE,
+    }
+    if engine in ("llamaparse", "auto"):
+        settings["llamaparse"] = LLAMA_PARSE_SETTINGS
+    if engine in ("local", "auto"):
+        settings["local"] = {
+            "version": LOCAL_PARSER_VERSION,
+            "min_chars_per_page": LOCAL_MIN_CHARS_PER_PAGE,
+            "min_printable_ratio": LOCAL_MIN_PRINTABLE_RATIO,
+        }
+    encoded = json.dumps(settings, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
 
 
 def _parse_file_sync(temp_path: str) -> str:
@@ -61,26 +124,171 @@ def _parse_file_sync(temp_path: str) -> str:
     return all_text
 
 
-async def parse_document(file: UploadFile) -> str:
-    suffix = Path(file.filename).suffix.lower()
-    if suffix not in [".pdf", ".doc", ".docx"]:
-        raise HTTPException(400, "Unsupported file type")
+def _parse_local_sync(temp_path: str) -> str:
+    """
+    Offline extraction with pypdf / python-docx. Raises LowQualityTextError
+    when the file type is not handled locally or its text layer is poor.
+    """
+    suffix = Path(temp_path).suffix.lower()
+    if suffix == ".pdf":
+        markdown, pages = extract_pdf_markdown(temp_path)
+    elif suffix == ".docx":
+        markdown, pages = extract_docx_markdown(temp_path)
+    else:
+        raise LowQualityTextError(f"No local extractor for {suffix}")
 
-    # Write to temp file
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        temp_path = tmp.name
+    if not is_good_text_layer(markdown, pages, LOCAL_MIN_CHARS_PER_PAGE, LOCAL_MIN_PRINTABLE_RATIO):
+        raise LowQualityTextError("Local text layer is too sparse or garbled")
+    return markdown
 
+
+def _parse_auto_sync(temp_path: str) -> str:
+    """Local fast path, LlamaParse only when the local text layer is poor."""
     try:
-        # Instead of calling load_data() directly, do it in a threadpool:
-        all_text = await run_in_threadpool(_parse_file_sync, temp_path)
+        return _parse_local_sync(temp_path)
+    except LowQualityTextError:
+        return _parse_file_sync(temp_path)
+
+
+# Pluggable parser engines: name -> sync callable(temp_path) -> markdown
+PARSER_BACKENDS = {
+    "auto": _parse_auto_sync,
+    "local": _parse_local_sync,
+    "llamaparse": _parse_file_sync,
+}
+
+
+##############################################################################
+# Page-parallel parsing for large PDFs
+##############################################################################
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PARSE_MAX_WORKERS)
+    return _process_pool
 
-        if not all_text.strip():
-            raise HTTPException(status_code=400, detail="No text extracted")
 
-        return all_text
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Parse error: {str(e)}")
+def _page_ranges(n_pages: int, per_range: int) -> List[Tuple[int, int]]:
+    per_range = max(1, per_range)
+    return [(start, min(start + per_range, n_pages)) for start in range(0, n_pages, per_range)]
+
+
+def _parse_llamaparse_range_sync(temp_path: str, start: int, end: int) -> str:
+    """Write pages [start, end) to their own PDF and run LlamaParse on it."""
+    reader = PdfReader(temp_path)
+    writer = PdfWriter()
+    for page in reader.pages[start:end]:
+        writer.add_page(page)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        writer.write(tmp)
+        range_path = tmp.name
+    try:
+        return _parse_file_sync(range_path)
     finally:
-        os.remove(temp_path)
+        os.remove(range_path)
+
+
+async def _parse_pdf_ranges(
+    engine: str,
+    temp_path: str,
+    n_pages: int,
+    progress: Optional[ProgressCallback] = None,
+) -> str:
+    """
+    Parse a large PDF as independent page ranges and stitch the markdown back
+    together in page order. With "auto", only the ranges whose local text
+    layer is poor (e.g. scanned attachments) are sent to LlamaParse.
+    """
+    ranges = _page_ranges(n_pages, PARSE_PAGES_PER_RANGE)
+    loop = asyncio.get_running_loop()
+    remote_slots = asyncio.Semaphore(max(1, PARSE_MAX_REMOTE_JOBS))
+    completed = 0
+
+    async def parse_range(start: int, end: int) -> str:
+        nonlocal completed
+        text = None
+        if engine in ("local", "auto"):
+            text, pages = await loop.run_in_executor(
+                _get_process_pool(), extract_pdf_markdown, temp_path, start, end)
+            if not is_good_text_layer(text, pages, LOCAL_MIN_CHARS_PER_PAGE, LOCAL_MIN_PRINTABLE_RATIO):
+                if engine == "local":
+                    raise LowQualityTextError(
+                        f"Local text layer is too sparse or garbled (pages {start + 1}-{end})")
+                text = None
+        if text is None:
+            async with remote_slots:
+                text = await run_in_threadpool(_parse_llamaparse_range_sync, temp_path, start, end)
+        completed += 1
+        if progress:
+            progress(completed, len(ranges))
+        return text
+
+    parts = await asyncio.gather(*[parse_range(start, end) for start, end in ranges])
+    return "\n\n".join(p for p in parts if p.strip())
+
+
+async def parse_document(
+    path: str,
+    filename: str,
+    engine: str | None = None,
+    progress: Optional[ProgressCallback] = None,
+    content_hash: Optional[str] = None,
+) -> str:
+    """
+    Parse the PDF/DOC/DOCX at `path` (uploaded as `filename`) into markdown
+    with the chosen engine ("auto", "local" or "llamaparse"; defaults to
+    PARSER_ENGINE). The file is read from disk, never loaded whole into
+    memory, and is left in place for the caller to remove. `content_hash` is
+    the SHA-256 of the file when the caller already computed it.
+
+    PDFs of PARSE_PARALLEL_MIN_PAGES pages or more are parsed as concurrent
+    page ranges; `progress(done, total)` is called as each range finishes.
+    """
+    engine = engine or DEFAULT_PARSER_ENGINE
+    if engine not in PARSER_BACKENDS:
+        raise HTTPException(400, f"Unknown parser engine '{engine}'")
+
+    suffix = Path(filename).suffix.lower()
+    if suffix not in [".pdf", ".doc", ".docx"]:
+        raise HTTPException(400, "Unsupported file type")
+    if Path(path).suffix.lower() != suffix:
+        raise ValueError(f"{path} must keep the upload's {suffix} suffix")
+
+    with stage("parse"):
+        # Serve previously parsed markdown for identical bytes + parser settings
+        cache = get_parse_cache()
+        if cache is not None:
+            content_hash = content_hash or await run_in_threadpool(hash_file, path)
+            key = parse_cache_key(content_hash, parser_settings_fingerprint(engine))
+            cached = await cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            n_pages = 0
+            if suffix == ".pdf":
+                try:
+                    n_pages = await run_in_threadpool(pdf_page_count, path)
+                except Exception:
+                    n_pages = 0     # unreadable for pypdf: let the engine deal with it
+
+            if n_pages >= max(PARSE_PARALLEL_MIN_PAGES, 2):
+                all_text = await _parse_pdf_ranges(engine, path, n_pages, progress)
+            else:
+                # Instead of calling load_data() directly, do it in a threadpool:
+                all_text = await run_in_threadpool(PARSER_BACKENDS[engine], path)
+                if progress:
+                    progress(1, 1)
+
+            if not all_text.strip():
+                raise HTTPException(status_code=400, detail="No text extracted")
+
+            if cache is not None:
+                await cache.put(key, all_text)
+            return all_text
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Parse error: {str(e)}")
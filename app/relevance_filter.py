@@ -0,0 +1,452 @@
+# app/relevance_filter.py
+"""
+Local relevance pre-filter in front of the LLM classifier.
+
+Many sections are administrative boilerplate ("Inspection and Acceptance",
+"Period of Performance", FAR clause lists, "Applicable Documents") or plainly
+task-bearing ("Scope of Work", "Deliverables") and do not need an LLM call to
+tell. Each section is scored locally:
+
+  1. heading rules derived from RELEVANCE_HEURISTICS settle the obvious ones;
+  2. a TF-IDF + logistic regression model over heading and snippet, trained
+     on verdicts the LLM gave before, settles sections it is confident about.
+
+Only the uncertain middle band goes to the LLM. Every LLM verdict is
+recorded as training data and the model retrains as new ones arrive; a small
+audit share of locally settled sections is still sent to the LLM so the
+agreement between the two can be tracked (stats(), logged per document).
+
+The model only switches on once it clears RELEVANCE_MODEL_MIN_PRECISION on
+held-out verdicts inside its confident band. Seeding and training run in a
+worker thread, never on the event loop; until a namespace's model is ready
+its sections are settled by the heading rules alone.
+
+Verdicts depend on the model, the prompts and the capabilities text, so they
+are stored, seeded and trained on per namespace (the fingerprint
+summarization also uses for the section dedup index). The heading rules do
+not: they encode Acato's capabilities (testing, tasks and deliverables are
+relevant; GFE, clauses and invoicing are not) and apply in every namespace.
+Set RELEVANCE_HEADING_RULES=0 when the capabilities text changes enough
+that they no longer hold.
+"""
+
+import os
+import re
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Heading rules. Irrelevant rules are kept narrow: a wrong IRRELEVANT drops
+# content from the summary, a wrong RELEVANT only costs a summary call.
+IRRELEVANT_HEADING_RULES = [re.compile(p) for p in (
+    r"\binspection\b.*\baccept",
+    r"\bacceptance\b.*\binspection\b",
+    r"\b(period|place)s? of performance\b",
+    r"\bapplicable (documents|publications|references|directives)\b",
+    r"\breference (documents|publications)\b",
+    r"\b(far|dfars)\b.*\bclauses?\b",
+    r"\bclauses? incorporated by reference\b",
+    r"\bcontract clauses\b",
+    r"\bgovernment[- ]furnished\b",
+    r"\b(invoicing|invoice submission|payment instructions)\b",
+    r"^travel\b",
+)]
+RELEVANT_HEADING_RULES = [re.compile(p) for p in (
+    r"\b(scope|statement) of work\b",
+    r"^scope\b",
+    r"\b(tasks?|deliverables?)\b",
+    r"\bkey personnel\b",
+    r"\bsurge support\b",
+    r"\b(software )?(testing|test and evaluation)\b",
+    r"\b(technical|functional|performance) requirements\b",
+    r"\bobjectives?\b",
+)]
+# Weaker cues: too loose to skip the classifier, good enough to start a
+# speculative summary while it runs (see speculation_prior)
+SPECULATIVE_HEADING_CUES = [re.compile(p) for p in (
+    r"\brequirements?\b",
+    r"\b(services|support)\b",
+    r"\b(software|systems?|application|automation|environment)\b",
+    r"\b(quality|assurance|compliance|documentation)\b",
+    r"\b(management|staffing|personnel)\b",
+    r"\btechnical\b",
+)]
+
+_NUMBERING = re.compile(r"^[\s#*]*(?:[A-Za-z]?[\d.\-]+|[IVXLC]+\.|[A-Z]\.)\s*")
+_TOKEN = re.compile(r"[a-z]{2,}")
+_SNIPPET_WORDS = 200
+
+
+def normalize_heading(heading: str) -> str:
+    """Lowercased heading without its numbering ("C.3.1", "IV.", "#")."""
+    return _NUMBERING.sub("", heading or "").strip().lower()
+
+
+def rule_verdict(heading: str) -> Optional[bool]:
+    """True / False when a heading rule matches, None otherwise."""
+    normalized = normalize_heading(heading)
+    if any(rule.search(normalized) for rule in IRRELEVANT_HEADING_RULES):
+        return False
+    if any(rule.search(normalized) for rule in RELEVANT_HEADING_RULES):
+        return True
+    return None
+
+
+def speculation_prior(heading: str, decision: Optional[Dict[str, Any]] = None) -> float:
+    """
+    Rough probability that a section still waiting for the LLM comes back
+    RELEVANT: the local verdict for audit samples, the model's probability
+    when it is active, else 0.7 for a speculative heading cue and 0.5 otherwise.
+    """
+    if decision is not None:
+        if decision.get("relevant") is not None:
+            return 0.95 if decision["relevant"] else 0.05
+        if decision.get("probability") is not None:
+            return decision["probability"]
+    verdict = rule_verdict(heading)
+    if verdict is not None:
+        return 0.95 if verdict else 0.05
+    normalized = normalize_heading(heading)
+    if any(cue.search(normalized) for cue in SPECULATIVE_HEADING_CUES):
+        return 0.7
+    return 0.5
+
+
+def _features(heading: str, snippet: str) -> List[str]:
+    heading_words = _TOKEN.findall(normalize_heading(heading))
+    features = [f"h:{w}" for w in heading_words]
+    features += [f"h:{a}_{b}" for a, b in zip(heading_words, heading_words[1:])]
+    features += _TOKEN.findall((snippet or "").lower())[:_SNIPPET_WORDS]
+    return features
+
+
+class TfidfLogistic:
+    """L2-regularized logistic regression on l2-normalized TF-IDF vectors."""
+
+    def __init__(self, max_features: int = 2000, l2: float = 1e-3, epochs: int = 300, lr: float = 2.0):
+        self.max_features = max_features
+        self.l2 = l2
+        self.epochs = epochs
+        self.lr = lr
+        self.vocab: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.weights = np.zeros(0, dtype=np.float32)
+        self.bias = 0.0
+
+    def _matrix(self, docs: List[List[str]]) -> np.ndarray:
+        X = np.zeros((len(docs), len(self.vocab)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            for term, count in Counter(doc).items():
+                col = self.vocab.get(term)
+                if col is not None:
+                    X[row, col] = 1.0 + np.log(count)
+        X *= self.idf
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        return X / np.maximum(norms, 1e-9)
+
+    def fit(self, docs: List[List[str]], labels: List[bool]) -> "TfidfLogistic":
+        df = Counter(term for doc in docs for term in set(doc))
+        terms = [t for t, n in df.most_common(self.max_features) if n >= 2]
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        n = len(docs)
+        self.idf = np.array([np.log((1 + n) / (1 + df[t])) + 1 for t in terms], dtype=np.float32)
+
+        X = self._matrix(docs)
+        y = np.asarray(labels, dtype=np.float32)
+        # balance the classes: relevant sections are usually the minority
+        pos = max(1.0, float(y.sum()))
+        neg = max(1.0, float(n - y.sum()))
+        sample_weight = np.where(y == 1, n / (2 * pos), n / (2 * neg)).astype(np.float32)
+
+        w = np.zeros(X.shape[1], dtype=np.float32)
+        b = 0.0
+        for _ in range(self.epochs):
+            p = 1.0 / (1.0 + np.exp(-(X @ w + b)))
+            err = (p - y) * sample_weight
+            w -= self.lr * (X.T @ err / n + self.l2 * w)
+            b -= self.lr * float(err.mean())
+        self.weights, self.bias = w, b
+        return self
+
+    def predict_proba(self, docs: List[List[str]]) -> np.ndarray:
+        if not self.vocab:
+            return np.full(len(docs), 0.5, dtype=np.float32)
+        return 1.0 / (1.0 + np.exp(-(self._matrix(docs) @ self.weights + self.bias)))
+
+
+class RelevanceFilter:
+    def __init__(
+        self,
+        path: str,
+        low: float = 0.05,
+        high: float = 0.95,
+        min_samples: int = 200,
+        min_precision: float = 0.97,
+        retrain_every: int = 50,
+        max_samples: int = 5000,
+        audit_rate: float = 0.05,
+        seed_path: Optional[str] = None,
+        heading_rules: bool = True,
+    ):
+        self.path = path
+        self.low = low
+        self.high = high
+        self.min_samples = min_samples
+        self.min_precision = min_precision
+        self.retrain_every = retrain_every
+        self.max_samples = max_samples
+        self.audit_rate = audit_rate
+        self.seed_path = seed_path
+        self.heading_rules = heading_rules
+
+        # per namespace: the model (None until it clears the precision gate)
+        self.models: Dict[str, Optional[TfidfLogistic]] = {}
+        self.model_info: Dict[str, Dict[str, Any]] = {}
+        self._since_training: Counter = Counter()
+        self._training: set = set()
+        self._tasks: set = set()
+        self._rng = random.Random()
+        self.counts = Counter()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS relevance_verdicts (
+                id INTEGER PRIMARY KEY,
+                heading TEXT NOT NULL,
+                snippet TEXT NOT NULL,
+                relevant INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                namespace TEXT
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(relevance_verdicts)")}
+        if "namespace" not in columns:
+            # verdicts stored before namespaces are never trained on again
+            self._conn.execute("ALTER TABLE relevance_verdicts ADD COLUMN namespace TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_relevance_verdicts_namespace ON relevance_verdicts (namespace, id)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "RelevanceFilter":
+        return cls(
+            path=os.getenv("RELEVANCE_FILTER_PATH", "./relevance_filter.db"),
+            low=float(os.getenv("RELEVANCE_FILTER_LOW", "0.05")),
+            high=float(os.getenv("RELEVANCE_FILTER_HIGH", "0.95")),
+            min_samples=int(os.getenv("RELEVANCE_MODEL_MIN_SAMPLES", "200")),
+            min_precision=float(os.getenv("RELEVANCE_MODEL_MIN_PRECISION", "0.97")),
+            retrain_every=int(os.getenv("RELEVANCE_MODEL_RETRAIN_EVERY", "50")),
+            audit_rate=float(os.getenv("RELEVANCE_FILTER_AUDIT_RATE", "0.05")),
+            seed_path=os.getenv("SECTION_DEDUP_PATH", "./section_index.db"),
+            heading_rules=os.getenv("RELEVANCE_HEADING_RULES", "1") != "0",
+        )
+
+    def _seed_from_section_index(self, namespace: str) -> None:
+        """
+        Start a namespace with no verdicts from the ones the section dedup
+        index already keeps for it (heading only, it stores no text).
+        """
+        with self._lock:
+            (stored,) = self._conn.execute(
+                "SELECT COUNT(*) FROM relevance_verdicts WHERE namespace = ?", (namespace,)).fetchone()
+        if stored or not self.seed_path or not os.path.exists(self.seed_path):
+            return
+        try:
+            with sqlite3.connect(self.seed_path) as src:
+                rows = src.execute(
+                    "SELECT heading, relevant, created_at, namespace FROM section_index WHERE namespace = ?",
+                    (namespace,),
+                ).fetchall()
+        except sqlite3.Error:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO relevance_verdicts (heading, snippet, relevant, created_at, namespace) "
+                "VALUES (?, '', ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    # ─── model ───
+    def train(self, namespace: str) -> Dict[str, Any]:
+        """
+        (Re)train a namespace's model from its most recent verdicts. The model
+        is only used when it reaches `min_precision` on a held-out fifth,
+        counted over the sections it would have settled on its own.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT heading, snippet, relevant FROM relevance_verdicts WHERE namespace = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (namespace, self.max_samples),
+            ).fetchall()
+        labels = [bool(r[2]) for r in rows]
+        info: Dict[str, Any] = {"trained_on": len(rows), "holdout_precision": None, "active": False}
+        if len(rows) < self.min_samples or min(labels.count(True), labels.count(False)) < 10:
+            self.models[namespace], self.model_info[namespace] = None, info
+            return info
+
+        docs = [_features(h, s) for h, s, _ in rows]
+        order = list(range(len(rows)))
+        random.Random(0).shuffle(order)
+        cut = len(order) // 5
+        held, train = order[:cut], order[cut:]
+        candidate = TfidfLogistic().fit([docs[i] for i in train], [labels[i] for i in train])
+        proba = candidate.predict_proba([docs[i] for i in held])
+        confident = [(p >= self.high, labels[i]) for p, i in zip(proba, held) if p >= self.high or p <= self.low]
+        precision = sum(pred == truth for pred, truth in confident) / len(confident) if confident else 0.0
+        info["holdout_precision"] = round(float(precision), 4)
+        info["holdout_coverage"] = round(len(confident) / max(1, len(held)), 4)
+
+        if precision >= self.min_precision:
+            self.models[namespace] = TfidfLogistic().fit(docs, labels)
+            info["active"] = True
+        else:
+            self.models[namespace] = None
+        self.model_info[namespace] = info
+        return info
+
+    async def _retrain(self, namespace: str, seed: bool = False) -> None:
+        try:
+            if seed:
+                await asyncio.to_thread(self._seed_from_section_index, namespace)
+            info = await asyncio.to_thread(self.train, namespace)
+            logger.info("Relevance model retrained (%s): %s", namespace[:12], info)
+        except Exception:
+            # rule-only until the next retrain_every verdicts try again
+            self.models.setdefault(namespace, None)
+            logger.exception("Relevance model training failed (%s)", namespace[:12])
+        finally:
+            self._training.discard(namespace)
+
+    def _start_training(self, namespace: str, seed: bool = False) -> None:
+        """Retrain off the event loop; the task is kept so it is not collected mid-run."""
+        self._training.add(namespace)
+        task = asyncio.get_running_loop().create_task(self._retrain(namespace, seed))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _model(self, namespace: str) -> Optional[TfidfLogistic]:
+        """
+        A namespace's model. The first use seeds and trains it in a worker
+        thread; until that finishes decisions are rule-only (None here).
+        """
+        if namespace not in self.models and namespace not in self._training:
+            try:
+                self._start_training(namespace, seed=True)
+            except RuntimeError:
+                # no running event loop (scripts): train in place
+                self._training.discard(namespace)
+                self._seed_from_section_index(namespace)
+                self.train(namespace)
+        return self.models.get(namespace)
+
+    # ─── decisions ───
+    def decide(self, heading: str, snippet: str, namespace: str) -> Dict[str, Any]:
+        """
+        Local verdict for one section: {"relevant": bool | None, "source":
+        "rule" | "model" | None, "probability": float | None, "audit": bool}.
+        relevant None (or audit True) means the LLM has to classify it.
+        """
+        decision: Dict[str, Any] = {"relevant": None, "source": None, "probability": None, "audit": False}
+        verdict = rule_verdict(heading) if self.heading_rules else None
+        model = self._model(namespace)
+        if verdict is not None:
+            decision.update(relevant=verdict, source="rule")
+        elif model is not None:
+            probability = float(model.predict_proba([_features(heading, snippet)])[0])
+            decision["probability"] = probability
+            if probability >= self.high or probability <= self.low:
+                decision.update(relevant=probability >= self.high, source="model")
+
+        if decision["source"] is None:
+            self.counts["deferred"] += 1
+        elif self._rng.random() < self.audit_rate:
+            decision["audit"] = True    # counted as audited once the LLM answers
+        else:
+            self.counts["settled_" + decision["source"]] += 1
+        return decision
+
+    def _record_sync(self, heading: str, snippet: str, relevant: bool, namespace: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO relevance_verdicts (heading, snippet, relevant, created_at, namespace) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (heading, snippet, int(relevant), time.time(), namespace),
+            )
+            self._conn.commit()
+
+    async def record(self, heading: str, snippet: str, relevant: bool, decision: Dict[str, Any],
+                     namespace: str) -> None:
+        """Store an LLM verdict and compare it with what `decide` said."""
+        if decision["source"] is not None:
+            self.counts["audited"] += 1
+            self.counts["audit_agreed"] += int(decision["relevant"] == relevant)
+        elif decision["probability"] is not None:
+            # how often the model's lean in the uncertain band matches the LLM
+            self.counts["deferred_scored"] += 1
+            self.counts["deferred_lean_agreed"] += int((decision["probability"] >= 0.5) == relevant)
+
+        await asyncio.to_thread(self._record_sync, heading, snippet[:1000], relevant, namespace)
+        self._since_training[namespace] += 1
+        if self._since_training[namespace] >= self.retrain_every and namespace not in self._training:
+            self._since_training[namespace] = 0
+            self._start_training(namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        c = self.counts
+        settled = c["settled_rule"] + c["settled_model"]
+        with self._lock:
+            (verdicts,) = self._conn.execute("SELECT COUNT(*) FROM relevance_verdicts").fetchone()
+        return {
+            "settled_rule": c["settled_rule"],
+            "settled_model": c["settled_model"],
+            "deferred": c["deferred"],
+            "local_rate": round(settled / (settled + c["deferred"] + c["audited"]), 4)
+            if settled + c["deferred"] + c["audited"] else 0.0,
+            "audited": c["audited"],
+            "audit_agreement": round(c["audit_agreed"] / c["audited"], 4) if c["audited"] else None,
+            "deferred_lean_agreement": round(c["deferred_lean_agreed"] / c["deferred_scored"], 4)
+            if c["deferred_scored"] else None,
+            "verdicts": verdicts,
+            "heading_rules": self.heading_rules,
+            "models": {
+                namespace[:12]: {
+                    "active": self.models.get(namespace) is not None,
+                    "trained_on": info["trained_on"],
+                    "holdout_precision": info["holdout_precision"],
+                }
+                for namespace, info in self.model_info.items()
+            },
+        }
+
+
+_filter: Optional[RelevanceFilter] = None
+
+
+def get_relevance_filter() -> Optional[RelevanceFilter]:
+    """
+    Return the process-wide pre-filter (each namespace's model is trained
+    from its stored verdicts in the background on first use), or None when
+    disabled with RELEVANCE_FILTER_ENABLED=0.
+    """
+    global _filter
+    if os.getenv("RELEVANCE_FILTER_ENABLED", "1") == "0":
+        return None
+    if _filter is None:
+        _filter = RelevanceFilter.from_env()
+    return _filter
+
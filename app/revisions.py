@@ -0,0 +1,260 @@
+# app/revisions.py
+"""
+Incremental re-summarization of amended solicitations.
+
+Agencies re-issue a 200-page RFP with a handful of sections changed. Every
+stored document keeps one DocumentSection row per flat section (heading,
+content fingerprint, verdict, summary). A new upload is treated as a
+revision of a stored document when
+
+  1. its filename has the same lineage (amendment / revision / version
+     markers stripped, see `lineage_key`) and shares at least
+     REVISION_LINEAGE_MIN_OVERLAP of its section fingerprints, or
+  2. any stored document shares at least REVISION_MIN_OVERLAP of them.
+
+`diff_sections` then pairs the new sections with the stored ones: identical
+fingerprints are unchanged and reuse the stored verdict and summary when
+both runs share a namespace (model, prompts and capabilities, see
+summarize_sections_stream); the rest are changed (same heading, new text),
+added or removed. Only changed and added sections, and unchanged ones from
+another namespace, go through the LLM passes. The pairing is also the
+section-level change report (the `revision` event, GET /summaries/{id}/changes).
+"""
+
+import os
+import re
+import hashlib
+import functools
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import DocumentSection, SessionLocal, Summary
+from app.relevance_filter import normalize_heading
+
+REVISION_MIN_OVERLAP = float(os.getenv("REVISION_MIN_OVERLAP", "0.5"))
+REVISION_LINEAGE_MIN_OVERLAP = float(os.getenv("REVISION_LINEAGE_MIN_OVERLAP", "0.2"))
+
+# "RFP_Amendment_0002", "RFP Amd 3", "RFP-rev-B", "RFP_v2", "RFP Mod 1", "RFP (1)",
+# "RFP final". Version / modification markers need a number, so "Section_V"
+# and "Pricing mode" keep their last word.
+_REVISION_SUFFIX = re.compile(
+    r"(?:\s*\(\d+\)"
+    r"|[\s_\-.]+(?:amendment|amend|amd|revision|rev)(?:[\s_\-.]*(?:\d+|[a-z](?![a-z])))?"
+    r"|[\s_\-.]+(?:modification|mod|version|v)[\s_\-.]*\d+"
+    r"|[\s_\-.]+a\d{3,4}"
+    r"|[\s_\-.]+(?:final|draft|updated?|revised|conformed))+$"
+)
+
+
+def lineage_key(filename: Optional[str]) -> Optional[str]:
+    """Lowercased filename stem without revision markers; None if nothing is left."""
+    stem = os.path.splitext(os.path.basename(filename or ""))[0].lower().strip()
+    stem = _REVISION_SUFFIX.sub("", stem).strip(" _-.")
+    return stem or None
+
+
+def section_fingerprint(heading: str, text: str) -> str:
+    """SHA-256 of a section's heading (without numbering) and whitespace-collapsed text."""
+    normalized = normalize_heading(heading) + "\n" + " ".join((text or "").split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def diff_sections(
+    base: List[Dict[str, Any]],
+    new: List[Dict[str, str]],
+    namespace: Optional[str] = None,
+) -> Tuple[Dict[int, Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Pair `new` sections ({"heading", "content_hash"}, in document order) with
+    the stored `base` sections ({"heading", "content_hash", "namespace",
+    "relevant", "summary"}, in document order).
+
+    Returns (carried, changes): `carried` maps new section index -> the
+    {"heading", "relevant", "summary"} an unchanged section reuses (the shape
+    of summarize_sections_stream's `completed`), only from base sections
+    stored under `namespace`; `changes` has one entry per section,
+    {"status": "unchanged" | "changed" | "added" | "removed", "heading",
+    "index", "base_index"}, removed sections last.
+    """
+    by_hash: Dict[str, List[int]] = {}
+    by_heading: Dict[str, List[int]] = {}
+    for b, sec in enumerate(base):
+        by_hash.setdefault(sec["content_hash"], []).append(b)
+        by_heading.setdefault(normalize_heading(sec["heading"]), []).append(b)
+
+    matched: Dict[int, Tuple[int, str]] = {}
+    used = set()
+    # identical content first, so a moved section is not mistaken for a change
+    for i, sec in enumerate(new):
+        for b in by_hash.get(sec["content_hash"], []):
+            if b not in used:
+                matched[i] = (b, "unchanged")
+                used.add(b)
+                break
+    for i, sec in enumerate(new):
+        if i in matched:
+            continue
+        for b in by_heading.get(normalize_heading(sec["heading"]), []):
+            if b not in used:
+                matched[i] = (b, "changed")
+                used.add(b)
+                break
+
+    carried: Dict[int, Dict[str, Any]] = {}
+    changes: List[Dict[str, Any]] = []
+    for i, sec in enumerate(new):
+        b, status = matched.get(i, (None, "added"))
+        changes.append({"status": status, "heading": sec["heading"], "index": i, "base_index": b})
+        if (status == "unchanged" and base[b]["relevant"] is not None
+                and namespace is not None and base[b].get("namespace") == namespace):
+            carried[i] = {
+                "heading": sec["heading"],
+                "relevant": base[b]["relevant"],
+                "summary": base[b]["summary"] if base[b]["relevant"] else None,
+            }
+    changes += [
+        {"status": "removed", "heading": sec["heading"], "index": None, "base_index": b}
+        for b, sec in enumerate(base) if b not in used
+    ]
+    return carried, changes
+
+
+def change_counts(changes: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts = Counter(change["status"] for change in changes)
+    return {status: counts[status] for status in ("unchanged", "changed", "added", "removed")}
+
+
+async def _document_sections(db: AsyncSession, summary_id: int) -> List[Dict[str, Any]]:
+    res = await db.execute(
+        select(DocumentSection)
+        .where(DocumentSection.summary_id == summary_id)
+        .order_by(DocumentSection.section_index)
+    )
+    return [
+        {
+            "heading": s.heading, "content_hash": s.content_hash, "namespace": s.namespace,
+            "relevant": s.relevant, "summary": s.summary,
+        }
+        for s in res.scalars().all()
+    ]
+
+
+async def _shared_sections(db: AsyncSession, fingerprints: List[str], summary_id: Optional[int] = None):
+    """(summary_id, distinct shared fingerprints) of the best-overlapping stored document."""
+    query = (
+        select(DocumentSection.summary_id, func.count(func.distinct(DocumentSection.content_hash)).label("shared"))
+        .where(DocumentSection.content_hash.in_(fingerprints))
+        .group_by(DocumentSection.summary_id)
+        .order_by(desc("shared"), desc(DocumentSection.summary_id))
+        .limit(1)
+    )
+    if summary_id is not None:
+        query = query.where(DocumentSection.summary_id == summary_id)
+    return (await db.execute(query)).first()
+
+
+async def find_base_revision(filename: str, sections: List[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+    """
+    The stored document `sections` ({"heading", "content_hash"}) revise, or
+    None: {"summary_id", "filename", "matched_by": "filename" | "sections",
+    "overlap", "sections": [...]}.
+    """
+    fingerprints = sorted({sec["content_hash"] for sec in sections})
+    if not fingerprints:
+        return None
+    async with SessionLocal() as db:
+        base = None
+        key = lineage_key(filename)
+        if key is not None:
+            res = await db.execute(
+                select(Summary.id)
+                .where(Summary.lineage_key == key)
+                .where(select(DocumentSection.id).where(DocumentSection.summary_id == Summary.id).exists())
+                .order_by(Summary.upload_time.desc(), Summary.id.desc())
+                .limit(1)
+            )
+            latest = res.scalar()
+            shared = await _shared_sections(db, fingerprints, latest) if latest is not None else None
+            if shared is not None and shared.shared / len(fingerprints) >= REVISION_LINEAGE_MIN_OVERLAP:
+                base = (latest, "filename", shared.shared)
+        if base is None:
+            shared = await _shared_sections(db, fingerprints)
+            if shared is not None and shared.shared / len(fingerprints) >= REVISION_MIN_OVERLAP:
+                base = (shared.summary_id, "sections", shared.shared)
+        if base is None:
+            return None
+
+        summary_id, matched_by, shared_count = base
+        row = await db.get(Summary, summary_id)
+        return {
+            "summary_id": summary_id,
+            "filename": row.filename,
+            "matched_by": matched_by,
+            "overlap": round(shared_count / len(fingerprints), 3),
+            "sections": await _document_sections(db, summary_id),
+        }
+
+
+def revision_finder(filename: str) -> Optional[Callable[[List[Dict[str, str]]], Awaitable[Optional[Dict[str, Any]]]]]:
+    """
+    `find_revision` callback for summarize_sections_stream, or None when
+    disabled with REVISION_DETECTION_ENABLED=0.
+    """
+    if os.getenv("REVISION_DETECTION_ENABLED", "1") == "0":
+        return None
+    return functools.partial(find_base_revision, filename)
+
+
+async def revision_report(db: AsyncSession, summary_id: int) -> Optional[Dict[str, Any]]:
+    """Change report of a stored revision against its base, or None if it has none."""
+    row = await db.get(Summary, summary_id)
+    if row is None or row.base_id is None:
+        return None
+    base = await db.get(Summary, row.base_id)
+    if base is None:
+        return None
+    _, changes = diff_sections(await _document_sections(db, base.id), await _document_sections(db, summary_id))
+    return {
+        "id": summary_id,
+        "base_id": base.id,
+        "base_filename": base.filename,
+        "counts": change_counts(changes),
+        "changes": changes,
+    }
+
+
+class SectionLedger:
+    """
+    Collects one run's events (sections, revision, classified, summary)
+    into the DocumentSection rows stored with its summary.
+    """
+
+    def __init__(self):
+        self.sections: List[Dict[str, Any]] = []
+        self.namespace: Optional[str] = None
+        self.revision: Optional[Dict[str, Any]] = None
+
+    @property
+    def base_id(self) -> Optional[int]:
+        return self.revision["base_id"] if self.revision else None
+
+    def observe(self, event: Dict[str, Any]) -> None:
+        kind = event["event"]
+        if kind == "sections":
+            self.sections = [
+                {"heading": heading, "content_hash": fingerprint, "relevant": None, "summary": None}
+                for heading, fingerprint in zip(event["headings"], event.get("fingerprints", []))
+            ]
+            self.namespace = event.get("namespace")
+        elif kind == "revision":
+            self.revision = {k: v for k, v in event.items() if k != "event"}
+        elif kind in ("classified", "summary") and event["index"] < len(self.sections):
+            section = self.sections[event["index"]]
+            if kind == "classified":
+                section["relevant"] = event["relevant"]
+            else:
+                section.update(relevant=True, summary=event["summary"])
@@ -0,0 +1,193 @@
+# app/search.py
+"""
+Full-text search over stored summaries, backed by an SQLite FTS5 index.
+
+summary_fts holds one row per stored document (rowid = summaries.id) with its
+filename, its section headings and its section summaries. SQLite triggers on
+summaries and summary_sections rebuild a document's row whenever it changes,
+so every write path (store_summary, DELETE /summaries/{id}, the legacy
+backfill) keeps the index in sync without extra code.
+
+Results are ranked with bm25 (filename and heading matches weigh more than
+body matches) and come with a highlighted snippet. When the SQLite build has
+no FTS5, `search_available()` is False and callers fall back to ILIKE.
+
+Tokens are not stemmed. The last word typed is matched as a prefix, and a
+prefix of a porter-stemmed index stops matching once it runs past the stem
+("automati" finds nothing when "automation" is stored as "autom").
+"""
+
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Float, Integer, String, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# bm25 column weights: filename, headings, body
+_BM25 = "bm25(summary_fts, 4.0, 2.0, 1.0)"
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+
+def _refresh(summary_id: str) -> str:
+    """Statements re-indexing one document (trigger body)."""
+    return f"""
+        DELETE FROM summary_fts WHERE rowid = {summary_id};
+        INSERT INTO summary_fts (rowid, filename, headings, body)
+        SELECT s.id, COALESCE(s.filename, ''),
+               COALESCE(group_concat(sec.heading, char(10)), ''),
+               COALESCE(group_concat(sec.summary, char(10)), '')
+        FROM summaries s
+        LEFT JOIN (
+            SELECT summary_id, heading, summary FROM summary_sections
+            WHERE summary_id = {summary_id} ORDER BY position
+        ) sec ON sec.summary_id = s.id
+        WHERE s.id = {summary_id}
+        GROUP BY s.id;
+    """
+
+
+_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE summary_fts USING fts5(
+        filename, headings, body,
+        tokenize = 'unicode61',
+        prefix = '2 3 4'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS summaries_fts_insert
+    AFTER INSERT ON summaries BEGIN {_refresh("NEW.id")} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS summaries_fts_rename
+    AFTER UPDATE OF filename ON summaries BEGIN {_refresh("NEW.id")} END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS summaries_fts_delete
+    AFTER DELETE ON summaries BEGIN
+        DELETE FROM summary_fts WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS summary_sections_fts_insert
+    AFTER INSERT ON summary_sections BEGIN {_refresh("NEW.summary_id")} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS summary_sections_fts_update
+    AFTER UPDATE ON summary_sections BEGIN {_refresh("NEW.summary_id")} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS summary_sections_fts_delete
+    AFTER DELETE ON summary_sections BEGIN {_refresh("OLD.summary_id")} END
+    """,
+]
+
+_REBUILD = """
+    INSERT INTO summary_fts (rowid, filename, headings, body)
+    SELECT s.id, COALESCE(s.filename, ''),
+           COALESCE(group_concat(sec.heading, char(10)), ''),
+           COALESCE(group_concat(sec.summary, char(10)), '')
+    FROM summaries s
+    LEFT JOIN (
+        SELECT summary_id, heading, summary FROM summary_sections
+        ORDER BY summary_id, position
+    ) sec ON sec.summary_id = s.id
+    GROUP BY s.id
+"""
+
+_available = False
+
+
+def search_available() -> bool:
+    return _available
+
+
+def install_search_index(sync_conn) -> None:
+    """
+    Create summary_fts and its triggers (run from init_db). A newly created
+    (or rebuilt) index is filled from the existing summary_sections rows.
+    """
+    global _available
+    exists = sync_conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'summary_fts'"
+    ).first()
+    try:
+        if exists and "porter" in exists[0]:
+            # built with the stemming tokenizer before; rebuild unstemmed
+            sync_conn.exec_driver_sql("DROP TABLE summary_fts")
+            exists = None
+        if not exists:
+            sync_conn.exec_driver_sql(_SEARCH_DDL[0])
+        for ddl in _SEARCH_DDL[1:]:
+            sync_conn.exec_driver_sql(ddl)
+        if not exists:
+            sync_conn.exec_driver_sql(_REBUILD)
+    except OperationalError as exc:
+        # SQLite compiled without FTS5
+        logger.warning("Full-text search disabled: %s", exc)
+        _available = False
+        return
+    _available = True
+
+
+def to_fts_query(query: str) -> Optional[str]:
+    """
+    Turn free text typed into the search box into an FTS5 query: every word
+    must match, the last one as a prefix (search-as-you-type). Quoting each
+    term keeps FTS5 syntax characters in user input from being interpreted.
+    """
+    terms = re.findall(r"\w+", query or "")
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+async def search_summaries(
+    db: AsyncSession, query: str, limit: int, offset: int = 0
+) -> Tuple[List[Dict], bool]:
+    """
+    Documents matching `query`, best match first. Returns (rows, has_more);
+    each row has id, filename, upload_time, score and a highlighted snippet.
+    """
+    match = to_fts_query(query)
+    if match is None:
+        return [], False
+
+    res = await db.execute(
+        text(
+            f"""
+            SELECT s.id, s.filename, s.upload_time, hits.score,
+                   snippet(summary_fts, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24) AS snippet
+            FROM (
+                SELECT rowid AS id, {_BM25} AS score
+                FROM summary_fts WHERE summary_fts MATCH :match
+                ORDER BY score, rowid DESC
+                LIMIT :limit OFFSET :offset
+            ) hits
+            JOIN summary_fts ON summary_fts.rowid = hits.id AND summary_fts MATCH :match
+            JOIN summaries s ON s.id = hits.id
+            ORDER BY hits.score, hits.id DESC
+            """
+        ).columns(id=Integer, filename=String, upload_time=DateTime, score=Float, snippet=String),
+        {"match": match, "limit": limit + 1, "offset": offset},
+    )
+    rows = res.all()
+    has_more = len(rows) > limit
+    return [
+        {
+            "id": r.id,
+            "filename": r.filename,
+            "upload_time": r.upload_time,
+            # bm25 is lower-is-better; flip it so larger means more relevant
+            "score": round(-r.score, 4),
+            "snippet": r.snippet,
+        }
+        for r in rows[:limit]
+    ], has_more
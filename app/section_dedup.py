@@ -0,0 +1,234 @@
+# app/section_dedup.py
+"""
+Local near-duplicate index over sections that were already classified and
+summarized.
+
+Solicitations reuse boilerplate (Section 508, security, FAR flow-downs) with
+small differences in numbering, dates and whitespace, so the exact-prompt LLM
+cache misses them. Each section (heading + body) is reduced to word 3-gram
+shingles with digits dropped, hashed into a MinHash signature, and bucketed
+with LSH banding. A new section whose estimated Jaccard similarity to a stored
+one is at least the threshold reuses that section's verdict. Its summary is
+reused only when both bodies carry the same numbers (quantities, dates, CLINs,
+periods): shingles ignore digits, so "36 months" and "48 months" match, but
+the stored summary would quote the old figure.
+
+Entries are grouped by a namespace (a fingerprint of the model and prompts) so
+changing the prompts never serves stale results.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SIGNATURE_SIZE = 128
+LSH_BANDS = 32                      # 32 bands x 4 rows
+SHINGLE_WORDS = 3
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)     # fixed: signatures must be stable across runs
+_PERM_A = _rng.randint(1, 1 << 31, size=SIGNATURE_SIZE).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=SIGNATURE_SIZE).astype(np.uint64)
+
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+_NUMBER = re.compile(r"\d+(?:[.,/:\-]\d+)*")
+
+
+def number_key(text: str) -> str:
+    """The numeric tokens of a section body, sorted: equal keys, equal figures."""
+    return " ".join(sorted(_NUMBER.findall(text or "")))
+
+
+def shingle_hashes(heading: str, text: str) -> List[int]:
+    """
+    32-bit hashes of the word 3-grams of heading + text. Digits and
+    punctuation are dropped, so "C.3.1 ... FY2024" and "4.2 ... FY2025"
+    shingle identically.
+    """
+    words = _WORD.findall(f"{heading}\n{text}".lower())
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return [
+        int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little")
+        for g in grams
+    ]
+
+
+def minhash_signature(hashes: List[int]) -> np.ndarray:
+    # (a*x + b) mod p with a, b, x < 2^32 stays inside uint64
+    x = np.asarray(hashes, dtype=np.uint64)
+    values = (_PERM_A[:, None] * x[None, :] + _PERM_B[:, None]) % _MERSENNE
+    return values.min(axis=1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.mean(a == b))
+
+
+def _band_keys(signature: np.ndarray) -> List[str]:
+    rows = SIGNATURE_SIZE // LSH_BANDS
+    return [
+        hashlib.blake2b(signature[i * rows:(i + 1) * rows].tobytes(), digest_size=8).hexdigest()
+        for i in range(LSH_BANDS)
+    ]
+
+
+class SectionIndex:
+    def __init__(self, path: str, threshold: float = 0.85, min_words: int = 40):
+        self.path = path
+        self.threshold = threshold
+        self.min_words = min_words
+        self.hits = 0
+        self.misses = 0
+        self.verdict_only = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS section_index (
+                id INTEGER PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                heading TEXT NOT NULL,
+                relevant INTEGER NOT NULL,
+                summary TEXT,
+                created_at REAL NOT NULL,
+                numbers TEXT
+            );
+            CREATE TABLE IF NOT EXISTS section_index_bands (
+                namespace TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                section_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_section_index_bands
+                ON section_index_bands (namespace, band, bucket);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(section_index)")}
+        if "numbers" not in columns:
+            # entries from before numbers were kept only ever reuse their verdict
+            self._conn.execute("ALTER TABLE section_index ADD COLUMN numbers TEXT")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "SectionIndex":
+        return cls(
+            path=os.getenv("SECTION_DEDUP_PATH", "./section_index.db"),
+            threshold=float(os.getenv("SECTION_DEDUP_THRESHOLD", "0.85")),
+            min_words=int(os.getenv("SECTION_DEDUP_MIN_WORDS", "40")),
+        )
+
+    def signature(self, heading: str, text: str) -> Optional[np.ndarray]:
+        """
+        MinHash signature of a section, or None when the section is too short
+        for a similarity match to be trustworthy.
+        """
+        if len(_WORD.findall(text.lower())) < self.min_words:
+            return None
+        return minhash_signature(shingle_hashes(heading, text))
+
+    # ─── sync primitives (run in a worker thread) ───
+    def _lookup_sync(self, namespace: str, signature: np.ndarray,
+                     numbers: Optional[str]) -> Optional[Dict[str, Any]]:
+        keys = _band_keys(signature)
+        clauses = " OR ".join("(band = ? AND bucket = ?)" for _ in keys)
+        params: List[Any] = [namespace]
+        for band, bucket in enumerate(keys):
+            params.extend((band, bucket))
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT id, signature, heading, relevant, summary, numbers FROM section_index WHERE id IN ("
+                f"  SELECT DISTINCT section_id FROM section_index_bands WHERE namespace = ? AND ({clauses})"
+                ")",
+                params,
+            ).fetchall()
+
+        best, best_score = None, self.threshold
+        for section_id, blob, heading, relevant, summary, stored_numbers in candidates:
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint64))
+            same_numbers = stored_numbers is not None and stored_numbers == numbers
+            # on a tie, prefer the entry whose summary can be reused
+            if score > best_score or (score == best_score and (best is None or same_numbers)):
+                best, best_score = {
+                    "id": section_id,
+                    "heading": heading,
+                    "relevant": bool(relevant),
+                    "summary": summary if same_numbers else None,
+                    "similarity": round(score, 4),
+                }, score
+        return best
+
+    def _add_sync(self, namespace: str, signature: np.ndarray, heading: str,
+                  relevant: bool, summary: Optional[str], numbers: Optional[str]) -> None:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO section_index (namespace, signature, heading, relevant, summary, created_at, numbers) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, signature.tobytes(), heading, int(relevant), summary, time.time(), numbers),
+            )
+            self._conn.executemany(
+                "INSERT INTO section_index_bands (namespace, band, bucket, section_id) VALUES (?, ?, ?, ?)",
+                [(namespace, band, bucket, cur.lastrowid) for band, bucket in enumerate(_band_keys(signature))],
+            )
+            self._conn.commit()
+
+    # ─── async API ───
+    async def lookup(self, namespace: str, signature: np.ndarray,
+                     numbers: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Closest stored section above the threshold, or None. Its "summary" is
+        None unless the stored body had the same `number_key` as this one.
+        """
+        match = await asyncio.to_thread(self._lookup_sync, namespace, signature, numbers)
+        if match is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if match["relevant"] and match["summary"] is None:
+                self.verdict_only += 1
+        return match
+
+    async def add(self, namespace: str, signature: np.ndarray, heading: str,
+                  relevant: bool, summary: Optional[str] = None, numbers: Optional[str] = None) -> None:
+        await asyncio.to_thread(self._add_sync, namespace, signature, heading, relevant, summary, numbers)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM section_index").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "verdict_only_hits": self.verdict_only,
+            "entries": entries,
+            "threshold": self.threshold,
+        }
+
+
+_index: Optional[SectionIndex] = None
+
+
+def get_section_index() -> Optional[SectionIndex]:
+    """
+    Return the process-wide section index, or None when disabled with
+    SECTION_DEDUP_ENABLED=0.
+    """
+    global _index
+    if os.getenv("SECTION_DEDUP_ENABLED", "1") == "0":
+        return None
+    if _index is None:
+        _index = SectionIndex.from_env()
+    return _index
@@ -1,8 +1,122 @@
 # app/services.py
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple
+
 from fastapi import HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 
+from .database import DocumentSection, Summary, SummarySection
 from .parser import parse_document  # <-- NEW import
+from .revisions import SectionLedger, lineage_key
 from .summarization import detect_headings_and_summarize_llm
+from .uploads import stage_upload
+
+
+# ─────────────────────────── summary storage ───────────────────────────
+def iso_utc(dt: datetime) -> str:
+    """
+    Return an ISO-8601 string in **UTC** with a trailing Z,
+    regardless of whether the input is naive or offset-aware.
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    else:
+        dt = dt.astimezone(timezone.utc)
+    return dt.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def summary_payload(row: Summary, summary_list) -> dict:
+    """The JSON shape clients receive for a stored summary."""
+    return {
+        "id": row.id,
+        "filename": row.filename,
+        "upload_time": iso_utc(row.upload_time),
+        "summary": summary_list,
+    }
+
+
+async def find_summary_by_hash(db: AsyncSession, content_hash: str) -> Optional[Summary]:
+    """Most recent stored summary of a byte-identical upload, if any."""
+    res = await db.execute(
+        select(Summary)
+        .where(Summary.content_hash == content_hash)
+        .order_by(Summary.upload_time.desc())
+        .limit(1)
+    )
+    return res.scalars().first()
+
+
+async def load_summary_sections(db: AsyncSession, summary_id: int) -> List[Dict[str, str]]:
+    """A stored document's sections, in document order."""
+    res = await db.execute(
+        select(SummarySection.heading, SummarySection.summary)
+        .where(SummarySection.summary_id == summary_id)
+        .order_by(SummarySection.position)
+    )
+    return [{"heading": heading, "summary": summary} for heading, summary in res.all()]
+
+
+async def store_summaries(
+    db: AsyncSession,
+    documents: List[Tuple[str, str, List[Dict[str, str]]]],
+    ledgers: Optional[List[Optional[SectionLedger]]] = None,
+) -> List[Summary]:
+    """
+    Insert one summary row per (filename, content_hash, result_list), each
+    with one child row per section, in a single transaction.
+
+    `ledgers` (one per document, or None) adds the DocumentSection rows a
+    later revision is diffed against and links the revision to its base.
+    """
+    now = datetime.now(timezone.utc)
+    ledgers = ledgers or [None] * len(documents)
+    rows = [
+        Summary(
+            filename=filename, upload_time=now, content_hash=content_hash, summary="",
+            lineage_key=lineage_key(filename), base_id=ledger.base_id if ledger else None,
+        )
+        for (filename, content_hash, _), ledger in zip(documents, ledgers)
+    ]
+    db.add_all(rows)
+    await db.flush()
+    db.add_all([
+        SummarySection(
+            summary_id=row.id,
+            position=position,
+            heading=sec["heading"],
+            summary=sec["summary"],
+        )
+        for row, (_, _, result_list) in zip(rows, documents)
+        for position, sec in enumerate(result_list)
+    ])
+    db.add_all([
+        DocumentSection(
+            summary_id=row.id,
+            section_index=index,
+            heading=sec["heading"],
+            content_hash=sec["content_hash"],
+            namespace=ledger.namespace,
+            relevant=sec["relevant"],
+            summary=sec["summary"],
+        )
+        for row, ledger in zip(rows, ledgers) if ledger is not None
+        for index, sec in enumerate(ledger.sections)
+    ])
+    await db.commit()
+    return rows
+
+
+async def store_summary(
+    db: AsyncSession,
+    filename: str,
+    content_hash: str,
+    result_list: List[Dict[str, str]],
+    ledger: Optional[SectionLedger] = None,
+) -> Summary:
+    """Insert a summary row with one child row per section and commit."""
+    (row,) = await store_summaries(db, [(filename, content_hash, result_list)], [ledger])
+    return row
 
 
 class SolicitationService:
@@ -17,7 +131,12 @@ class SolicitationService:
           3) Returning a list of { heading, summary }.
         """
         # 1) Parse the doc to get combined text
-        parsed_text = await parse_document(file)
+        upload = await stage_upload(file)
+        try:
+            parsed_text = await parse_document(
+                upload.path, upload.filename, content_hash=upload.content_hash)
+        finally:
+            upload.cleanup()
         if not parsed_text:
             raise HTTPException(
                 status_code=400, detail="No text found in uploaded document.")
@@ -0,0 +1,23 @@
+# app/streaming.py
+import asyncio
+
+
+async def drain_until_done(task: "asyncio.Future", events: asyncio.Queue):
+    """
+    Yield items put on `events` while `task` runs, then whatever is left.
+    The task is cancelled if the consumer goes away early; its exception
+    (if any) is left for the caller to pick up via `task.result()`.
+    """
+    try:
+        while not task.done():
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        while not events.empty():
+            yield events.get_nowait()
+    finally:
+        if not task.done():
+            task.cancel()
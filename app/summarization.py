@@ -1,17 +1,69 @@
+import os
 import re
+import json
+import time
 import asyncio
-from typing import List, Dict, Any
+import hashlib
+import logging
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
-# ✅ modern import – no more deprecation warning
-from langchain_openai import ChatOpenAI
-
-from langchain.schema import HumanMessage, SystemMessage
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from langchain.prompts import PromptTemplate
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from app.clients import get_client_registry
+from app.llm_cache import cache_key, get_llm_cache
+from app.llm_scheduler import count_tokens, get_llm_scheduler, upload_scope
+from app.metrics import pipeline_trace, record_llm_call, record_speculation, stage
+from app.numbering import is_numbered
+from app.relevance_filter import get_relevance_filter, speculation_prior
+from app.revisions import change_counts, diff_sections, section_fingerprint
+from app.section_dedup import get_section_index, number_key
+from app.streaming import drain_until_done
+
+logger = logging.getLogger(__name__)
+
+
+def _token_usage(response, messages: List[Any], model_name: str):
+    """(prompt, completion) tokens as billed, or counted locally if not reported."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        return usage["input_tokens"], usage.get("output_tokens", 0)
+    prompt = sum(count_tokens(str(getattr(m, "content", m)), model_name) for m in messages)
+    return prompt, count_tokens(response.content or "", model_name)
+
+
+async def _ainvoke(llm, messages: List[Any]):
+    """
+    Single choke point for every chat completion in this module: answers come
+    from the persistent response cache when possible, otherwise the call goes
+    through the process-wide scheduler (concurrency cap, RPM/TPM budgets,
+    retries, per-upload fairness) and the reply is cached. Every call is
+    recorded in app.metrics.
+    """
+    model_name = getattr(llm, "model_name", "")
+    cache = get_llm_cache()
+    key = None
+    if cache is not None:
+        key = cache_key(model_name, getattr(llm, "temperature", 0.0), messages)
+        cached = await cache.get(key)
+        if cached is not None:
+            record_llm_call(model_name, 0.0, 0, 0, cached=True)
+            return AIMessage(content=cached)
+
+    start = time.perf_counter()
+    response = await get_llm_scheduler().invoke(llm, messages)
+    prompt_tokens, completion_tokens = _token_usage(response, messages, model_name)
+    record_llm_call(model_name, time.perf_counter() - start, prompt_tokens, completion_tokens, cached=False)
+
+    if cache is not None and response.content:
+        await cache.put(key, model_name, response.content)
+    return response
+
 
 ##############################################################################
-# (A) PARSE (REGEX) -> REFINE (LLM) FOR TRUE NUMBERED HEADINGS
+# (A) PARSE (REGEX) -> REFINE (LOCAL + LLM) FOR TRUE NUMBERED HEADINGS
 ##############################################################################
 
 def parse_markdown_headings(document_text: str) -> List[Dict[str, str]]:
@@ -40,60 +92,89 @@ def parse_markdown_headings(document_text: str) -> List[Dict[str, str]]:
     return results
 
 
-# Prompt for heading refinement
-REFINE_HEADING_PROMPT = PromptTemplate(
-    input_variables=["heading_text"],
+# Batched prompt for the headings the local detector could not decide
+REFINE_HEADINGS_BATCH_PROMPT = PromptTemplate(
+    input_variables=["numbered_lines"],
     template="""
-You are given a heading line from a Markdown file. It starts with one or more '#' characters.
-We suspect it might be a "numbered heading" (i.e., it has a numeric or roman-numeral scheme in its text).
-Examples of valid numbering: "1.", "1.2", "III.", "XIV", "2.1.3", etc.
+You are given heading lines from a Markdown file, one per line, each prefixed with an ID and a colon.
+Decide for each one whether it is a "numbered heading" (i.e., its text starts with a numeric,
+lettered or roman-numeral scheme). Examples of valid numbering: "1.", "1.2", "III.", "XIV", "2.1.3", "C.3", "(a)".
 
-If the heading text has a numbering or roman-numeral scheme, respond exactly "TRUE_HEADING".
-Otherwise respond exactly "NOT_HEADING".
+Respond with one line per ID, in the form "<ID>: TRUE_HEADING" or "<ID>: NOT_HEADING", and nothing else.
 
-Heading text: "{heading_text}"
+Lines:
+{numbered_lines}
 """
 )
 
+# Max ambiguous lines sent in a single refinement prompt
+REFINE_BATCH_SIZE = 40
+
+_REFINE_VERDICT = re.compile(r'^\s*(\d+)\s*[:.)\-]\s*(TRUE_HEADING|NOT_HEADING)', re.MULTILINE)
+
+
+async def _refine_ambiguous_batch(llm, batch: List[str]) -> List[bool]:
+    """
+    Ask the LLM about several ambiguous heading lines in one prompt.
+    Lines missing from the reply are treated as NOT_HEADING.
+    """
+    system_msg = SystemMessage(
+        content="You are a strict classifier for heading lines. Output only '<ID>: TRUE_HEADING' or '<ID>: NOT_HEADING' lines."
+    )
+    numbered_lines = "\n".join(f"{i}: {text}" for i, text in enumerate(batch, 1))
+    user_msg = HumanMessage(
+        content=REFINE_HEADINGS_BATCH_PROMPT.format(numbered_lines=numbered_lines)
+    )
+    response = await _ainvoke(llm, [system_msg, user_msg])
+
+    verdicts = {
+        int(num): verdict == "TRUE_HEADING"
+        for num, verdict in _REFINE_VERDICT.findall((response.content or "").upper())
+    }
+    return [verdicts.get(i, False) for i in range(1, len(batch) + 1)]
+
 
 async def refine_headings_by_numbering(llm, lines: List[Dict[str, str]]) -> None:
     """
     For each line that is labeled heading-level-* by the regex pass,
-    confirm via LLM whether it truly has a numbering/roman-numeral scheme.
+    confirm whether it truly has a numbering/roman-numeral scheme.
     If it does not, demote it to body-text.
 
+    The local detector in numbering.py settles almost every line; only the
+    ambiguous remainder goes to the LLM, REFINE_BATCH_SIZE lines per prompt.
+
     This function mutates the 'lines' list in place.
     """
-    tasks = []
+    ambiguous_indices = []
 
     # We'll only refine lines that were labeled as headings
-    to_refine_indices = [
-        i for i, item in enumerate(lines)
-        if item["class"].startswith("heading-level")
+    for i, item in enumerate(lines):
+        if not item["class"].startswith("heading-level"):
+            continue
+        numbered = is_numbered(item["text"])
+        if numbered is None:
+            ambiguous_indices.append(i)
+        elif not numbered:
+            lines[i]["class"] = "body-text"
+
+    if not ambiguous_indices:
+        return
+
+    batches = [
+        ambiguous_indices[i:i + REFINE_BATCH_SIZE]
+        for i in range(0, len(ambiguous_indices), REFINE_BATCH_SIZE)
     ]
-
-    for idx in to_refine_indices:
-        heading_text = lines[idx]["text"]
-
-        system_msg = SystemMessage(
-            content="You are a strict classifier for heading lines. Output EXACTLY 'TRUE_HEADING' or 'NOT_HEADING'."
-        )
-        user_msg = HumanMessage(
-            content=REFINE_HEADING_PROMPT.format(heading_text=heading_text)
-        )
-
-        # Gather tasks to run concurrently
-        tasks.append((idx, llm.ainvoke([system_msg, user_msg])))
-
-    # Run all LLM tasks
-    results = await asyncio.gather(*[task[1] for task in tasks])
+    results = await asyncio.gather(*[
+        _refine_ambiguous_batch(llm, [lines[idx]["text"] for idx in batch])
+        for batch in batches
+    ])
 
     # Update lines in-place
-    for (idx, _), response in zip(tasks, results):
-        verdict = response.content.strip().upper()
-        if verdict != "TRUE_HEADING":
-            # If not confirmed as a valid numbered heading, demote to body-text
-            lines[idx]["class"] = "body-text"
+    for batch, verdicts in zip(batches, results):
+        for idx, is_heading in zip(batch, verdicts):
+            if not is_heading:
+                # If not confirmed as a valid numbered heading, demote to body-text
+                lines[idx]["class"] = "body-text"
 
 ##############################################################################
 # (B.2) BUILD A FLAT LIST OF SECTIONS (FOR SOLUTION A)
@@ -143,17 +224,8 @@ def build_flat_sections(lines_classified: List[Dict[str, str]]) -> List[Dict[str
 # (C) LLM-BASED HEADING RELEVANCE (PASS 1)
 ##############################################################################
 
-HEADING_CLASSIFICATION_PROMPT = PromptTemplate(
-    input_variables=["capabilities", "heading_text", "content_snippet"],
-    template="""
-You are an expert analyst reviewing section headers and content from government solicitations.
-Acato is a company with the following capabilities:
-
-{capabilities}
-
-Your task is to determine whether the **section below** is RELEVANT or IRRELEVANT to Acato’s potential role — such as being awarded or performing substantive work.
-
-Use the following heuristics:
+# Shared by the single-section and the batched classification prompts
+RELEVANCE_HEURISTICS = """Use the following heuristics:
 
 - **RELEVANT** if the section covers topics like:
     • Scope of Work
@@ -177,7 +249,21 @@ Use the following heuristics:
     • Period of Performance details
     • Any purely administrative or legal clauses that do not affect tasks or deliverables
 
-Output exactly one word: "RELEVANT" or "IRRELEVANT"
+"""
+
+HEADING_CLASSIFICATION_PROMPT = PromptTemplate(
+    input_variables=["capabilities", "heading_text", "content_snippet"],
+    template="""
+You are an expert analyst reviewing section headers and content from government solicitations.
+Acato is a company with the following capabilities:
+
+{capabilities}
+
+Your task is to determine whether the **section below** is RELEVANT or IRRELEVANT to Acato’s potential role — such as being awarded or performing substantive work.
+
+"""
+    + RELEVANCE_HEURISTICS
+    + """Output exactly one word: "RELEVANT" or "IRRELEVANT"
 
 Heading: {heading_text}
 
@@ -211,12 +297,120 @@ async def classify_heading_with_llm(
     )
     user_msg = HumanMessage(content=user_prompt)
 
-    response = await llm.ainvoke([system_msg, user_msg])
+    response = await _ainvoke(llm, [system_msg, user_msg])
     classification = response.content.strip().upper()
 
     return classification.startswith("RELEVANT")
 
 
+BATCH_CLASSIFICATION_PROMPT = PromptTemplate(
+    input_variables=["capabilities", "sections"],
+    template="""
+You are an expert analyst reviewing section headers and content from government solicitations.
+Acato is a company with the following capabilities:
+
+{capabilities}
+
+Your task is to determine, for EACH section below, whether it is RELEVANT or IRRELEVANT to Acato’s potential role — such as being awarded or performing substantive work.
+
+"""
+    + RELEVANCE_HEURISTICS
+    + """Respond with a JSON array only, one object per section, in the form
+[{{"id": <ID>, "verdict": "RELEVANT"}}, {{"id": <ID>, "verdict": "IRRELEVANT"}}, ...]
+
+Sections:
+{sections}
+"""
+)
+
+# Prompt-token budget for the per-section part of one batched prompt; the
+# shared instructions are paid once per batch instead of once per section.
+CLASSIFY_BATCH_TOKENS = int(os.getenv("CLASSIFY_BATCH_TOKENS", "3000"))
+CLASSIFY_BATCH_MAX_SECTIONS = int(os.getenv("CLASSIFY_BATCH_MAX_SECTIONS", "20"))
+
+_JSON_ARRAY = re.compile(r'\[.*\]', re.DOTALL)
+
+
+def _section_block(section_id: int, heading: str, snippet: str) -> str:
+    return f"### Section {section_id}\nHeading: {heading}\nContent:\n{snippet}\n"
+
+
+def plan_classification_batches(
+    items: List[Dict[str, Any]],
+    token_budget: int = CLASSIFY_BATCH_TOKENS,
+    max_sections: int = CLASSIFY_BATCH_MAX_SECTIONS,
+    model_name: str = "gpt-3.5-turbo",
+) -> List[List[Dict[str, Any]]]:
+    """
+    Group {"index", "heading", "snippet"} items, in order, so that each
+    group's section blocks fit `token_budget` prompt tokens and
+    `max_sections` sections. An item larger than the budget gets a group of
+    its own.
+    """
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = 0
+    for item in items:
+        cost = count_tokens(_section_block(len(current) + 1, item["heading"], item["snippet"]), model_name)
+        if current and (used + cost > token_budget or len(current) >= max_sections):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_batch_verdicts(content: str, count: int) -> List[bool]:
+    """
+    Validate a batched reply: a JSON array with exactly one RELEVANT /
+    IRRELEVANT verdict per section id 1..count. Raises ValueError otherwise.
+    """
+    match = _JSON_ARRAY.search(content or "")
+    if not match:
+        raise ValueError("no JSON array in batched classification reply")
+    parsed = json.loads(match.group(0))
+    verdicts: Dict[int, bool] = {}
+    for entry in parsed:
+        verdict = str(entry.get("verdict", "")).strip().upper() if isinstance(entry, dict) else ""
+        if verdict not in ("RELEVANT", "IRRELEVANT"):
+            raise ValueError(f"bad verdict entry: {entry!r}")
+        verdicts[int(entry["id"])] = verdict == "RELEVANT"
+    if sorted(verdicts) != list(range(1, count + 1)):
+        raise ValueError(f"expected ids 1..{count}, got {sorted(verdicts)}")
+    return [verdicts[i] for i in range(1, count + 1)]
+
+
+async def classify_headings_batch(
+    llm,
+    batch: List[Dict[str, Any]],
+    capabilities_text: str,
+) -> List[bool]:
+    """
+    Classify several {"heading", "snippet"} sections with one prompt.
+    Raises ValueError when the reply does not validate.
+    """
+    system_msg = SystemMessage(
+        content=(
+            "You are a helpful classifier. You will return only a JSON array of "
+            "RELEVANT / IRRELEVANT verdicts, one per section, based on whether the content "
+            "matches Acato's capabilities."
+        )
+    )
+    sections = "\n".join(
+        _section_block(i, item["heading"], item["snippet"]) for i, item in enumerate(batch, 1)
+    )
+    user_msg = HumanMessage(
+        content=BATCH_CLASSIFICATION_PROMPT.format(capabilities=capabilities_text, sections=sections)
+    )
+    response = await _ainvoke(llm, [system_msg, user_msg])
+    try:
+        return _parse_batch_verdicts(response.content, len(batch))
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError(f"invalid batched classification reply: {exc}") from exc
+
+
 ##############################################################################
 # (D) PROMPT TEMPLATE FOR SUMMARIZATION (PASS 2)
 ##############################################################################
@@ -236,12 +430,54 @@ SECTION TEXT:
 )
 
 
+# Context windows (tokens) of the chat models used here
+MODEL_CONTEXT_TOKENS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+# Reserved for the bullet-list reply
+SUMMARY_COMPLETION_TOKENS = 1024
+# Upper bound on section text per summary call, even with a larger context
+SUMMARY_MAX_CHUNK_TOKENS = int(os.getenv("SUMMARY_MAX_CHUNK_TOKENS", "12000"))
+SUMMARY_CHUNK_OVERLAP_TOKENS = 200
+
+
+def summary_chunk_tokens(model_name: str) -> int:
+    """Largest section text (in tokens) one SOW_SUMMARY_PROMPT call can take."""
+    context = MODEL_CONTEXT_TOKENS.get(model_name, 8192)
+    # template + heading + chat framing
+    prompt = count_tokens(SOW_SUMMARY_PROMPT.template, model_name) + 256
+    return max(500, min(SUMMARY_MAX_CHUNK_TOKENS, context - prompt - SUMMARY_COMPLETION_TOKENS))
+
+
+def split_for_summary(text: str, model_name: str) -> List[str]:
+    """
+    The section as a single chunk when it fits `summary_chunk_tokens`,
+    otherwise token-sized chunks (split on paragraph / line / word boundaries).
+    """
+    limit = summary_chunk_tokens(model_name)
+    if count_tokens(text, model_name) <= limit:
+        return [text] if text.strip() else []
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=limit,
+        chunk_overlap=SUMMARY_CHUNK_OVERLAP_TOKENS,
+        length_function=lambda t: count_tokens(t, model_name),
+    )
+    return [chunk.strip() for chunk in splitter.split_text(text) if chunk.strip()]
+
+
 async def summarize_section(llm, heading: str, text: str) -> str:
     """
     Summarizes a document section using the SOW_SUMMARY_PROMPT.
     Returns raw string (which may exceed 5 bullets if the LLM doesn't follow instructions).
     """
-    response = await (SOW_SUMMARY_PROMPT | llm).ainvoke({"heading": heading, "text": text})
+    user_msg = HumanMessage(
+        content=SOW_SUMMARY_PROMPT.format(heading=heading, text=text)
+    )
+    response = await _ainvoke(llm, [user_msg])
     return response.content.strip() if response.content else ""
 
 
@@ -265,6 +501,45 @@ Raw summary:
 )
 
 
+MAX_BULLETS = 5
+
+_BULLET = re.compile(r'^\s*(?:[-*•‣▪–]|\d{1,2}[.)])\s+')
+
+
+def _top_level_bullets(lines: List[str]) -> List[bool]:
+    """
+    Per line: does it start a top-level bullet? Top level is the shallowest
+    bullet indent in the text; deeper (nested) bullets belong to the bullet
+    above them, like continuation lines.
+    """
+    indents = [
+        len(line.expandtabs(4)) - len(line.expandtabs(4).lstrip()) if _BULLET.match(line) else None
+        for line in lines
+    ]
+    top = min((i for i in indents if i is not None), default=None)
+    return [indent is not None and indent == top for indent in indents]
+
+
+def count_bullets(text: str) -> int:
+    return sum(_top_level_bullets((text or "").splitlines()))
+
+
+def truncate_bullets(text: str, max_bullets: int = MAX_BULLETS) -> str:
+    """
+    Keep everything up to the end of the `max_bullets`-th top-level bullet
+    (continuation lines and nested bullets included) and drop the rest.
+    """
+    lines = (text or "").splitlines()
+    kept, seen = [], 0
+    for line, top_level in zip(lines, _top_level_bullets(lines)):
+        if top_level:
+            seen += 1
+            if seen > max_bullets:
+                break
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
 async def enforce_bullet_limit(llm, text: str) -> str:
     """
     A second LLM pass that ensures the final text has no more than 5 bullets.
@@ -282,7 +557,7 @@ async def enforce_bullet_limit(llm, text: str) -> str:
         content=ENFORCE_BULLET_LIMIT_PROMPT.format(raw_summary=text)
     )
 
-    response = await llm.ainvoke([system_msg, user_msg])
+    response = await _ainvoke(llm, [system_msg, user_msg])
     return response.content.strip() if response.content else ""
 
 
@@ -290,23 +565,75 @@ async def enforce_bullet_limit(llm, text: str) -> str:
 # (E) MAIN: PARSE -> REFINE -> BUILD FLAT -> PASS1 (CLASSIFY) -> PASS2 (SUMMARIZE)
 ##############################################################################
 
-async def detect_headings_and_summarize_llm(
+# Upper bound on simultaneous LLM calls for a single document
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "8"))
+
+# Speculative mode: sections whose prior of relevance is at least
+# SPECULATION_MIN_PRIOR start summarizing while the LLM classifies them
+SUMMARY_SPECULATIVE = os.getenv("SUMMARY_SPECULATIVE", "0") == "1"
+SPECULATION_MIN_PRIOR = float(os.getenv("SPECULATION_MIN_PRIOR", "0.6"))
+
+
+async def summarize_sections_stream(
     document_text: str,
     openai_api_key: str,
-    debug: bool = True
-) -> List[Dict[str, str]]:
+    debug: bool = False,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    upload_id: Optional[str] = None,
+    completed: Optional[Dict[int, Dict[str, Any]]] = None,
+    classify_batch_tokens: int = CLASSIFY_BATCH_TOKENS,
+    slots: Optional[asyncio.Semaphore] = None,
+    speculative: bool = SUMMARY_SPECULATIVE,
+    find_revision: Optional[Callable[[List[Dict[str, str]]], Awaitable[Optional[Dict[str, Any]]]]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
     """
-    SOLUTION A: 
+    SOLUTION A, as a stream of per-section events:
     1) Parse doc lines using a simplified approach that treats ANY '#' as top-level heading
-    2) LLM-based refinement: lines with '#' are checked to confirm they have numbering or roman numerals
+    2) Refinement: lines with '#' are checked to confirm they have numbering or roman numerals
+       (local regex detector; batched LLM calls only for ambiguous lines)
        - If not, convert them to body-text.
     3) Build a FLAT structure (no nested hierarchy)
-    4) Pass 1: For each section, do an LLM-based classification
-       (given some internal 'capabilities_text').
-    5) Pass 2: Summarize only the headings deemed RELEVANT, chunking if necessary.
-    6) A second LLM prompt strictly enforces no more than 5 bullet points.
-
-    Returns list of { "heading": <h>, "summary": <s> }.
+    4) Pass 1: Sections the local pre-filter (app/relevance_filter.py) is
+       sure about are settled without a call. For the rest, do an LLM-based
+       classification (given some internal 'capabilities_text'), several sections per prompt
+       (see `plan_classification_batches`; `classify_batch_tokens=0` sends one
+       prompt per section). A batch whose reply does not validate is retried
+       section by section.
+    5) Pass 2: Summarize only the headings deemed RELEVANT, in one call when
+       the section fits the model's context, otherwise in token-sized chunks.
+    6) No more than 5 bullet points: counted locally; only merged chunk
+       summaries over the limit get a second LLM pass.
+
+    Steps 4-6 run concurrently across sections; at most `max_concurrency`
+    LLM calls are in flight at once (or as many as `slots` allows, when a
+    semaphore shared by several documents is passed), all tagged with
+    `upload_id` for the scheduler's per-upload fairness. Events are yielded as soon as they happen,
+    so they arrive in completion order; `index` is the section's position:
+
+      {"event": "sections",   "count": n, "headings": [...], "fingerprints": [...],
+                              "namespace": ns}
+      {"event": "revision",   "base_id": id, "base_filename": f, "matched_by": m,
+                              "overlap": x, "counts": {...}, "changes": [...]}
+      {"event": "classified", "index": i, "heading": h, "relevant": bool}
+      {"event": "summary",    "index": i, "heading": h, "summary": s}
+
+    `completed` maps section index -> {"heading", "relevant", "summary"} from
+    an earlier, interrupted run (job checkpoints). Matching sections replay
+    their stored results instead of calling the LLM again.
+
+    Sections that are near-duplicates of one summarized before (see
+    app/section_dedup.py) reuse its verdict and summary as well.
+
+    `find_revision` (see app/revisions.py) is given the sections' headings
+    and fingerprints; if it returns a stored document this one revises, the
+    unchanged sections reuse its verdicts and summaries (checkpoints still
+    take precedence) and a `revision` event carries the change report.
+
+    With `speculative`, sections waiting for an LLM verdict whose prior of
+    relevance (`speculation_prior`: heading cues, past verdicts) reaches
+    SPECULATION_MIN_PRIOR start their summary calls right away; the work is
+    cancelled if the verdict is IRRELEVANT. Latency saved and tokens wasted
+    end up in the trace's "speculation" entry and in app.metrics.
     """
 
     # Example text describing Acato's capabilities
@@ -322,15 +649,15 @@ async def detect_headings_and_summarize_llm(
     if not lines_classified:
         if debug:
             print("[DEBUG] No headings or text found.")
-        return []
+        yield {"event": "sections", "count": 0, "headings": [], "fingerprints": [], "namespace": None}
+        return
 
-    # 2) Refine headings using LLM
-    llm_refine = ChatOpenAI(
-        model_name="gpt-3.5-turbo",
-        temperature=0.0,
-        openai_api_key=openai_api_key
-    )
-    await refine_headings_by_numbering(llm_refine, lines_classified)
+    # 2) Refine headings (local detector, LLM only for ambiguous lines)
+    clients = get_client_registry()
+    llm_refine = clients.chat_model(openai_api_key, temperature=0.0)
+    with (upload_scope(upload_id) if upload_id else nullcontext()):
+        with stage("refine"):
+            await refine_headings_by_numbering(llm_refine, lines_classified)
 
     # 3) Build FLAT sections
     flat_sections = build_flat_sections(lines_classified)
@@ -342,78 +669,336 @@ async def detect_headings_and_summarize_llm(
             print(
                 f"Section {i+1} Heading: '{sec['heading']}' | length: {text_len}")
 
-    # Create LLMs for classification and summarization
-    llm_classify = ChatOpenAI(
-        model_name="gpt-3.5-turbo",
-        temperature=0.1,
-        openai_api_key=openai_api_key
-    )
-    llm_summary = ChatOpenAI(
-        model_name="gpt-3.5-turbo",
-        temperature=0.0,
-        openai_api_key=openai_api_key
-    )
+    # Shared, pooled LLMs for classification and summarization
+    llm_classify = clients.chat_model(openai_api_key, temperature=0.1)
+    llm_summary = clients.chat_model(openai_api_key, temperature=0.0)
+
+    # Near-duplicate reuse, the relevance pre-filter's verdicts and results
+    # carried over from a revised document are only valid for the same
+    # model, prompts and capabilities
+    section_index = get_section_index()
+    dedup_namespace = hashlib.sha256("\x00".join([
+        llm_classify.model_name, capabilities_text,
+        HEADING_CLASSIFICATION_PROMPT.template, SOW_SUMMARY_PROMPT.template,
+        ENFORCE_BULLET_LIMIT_PROMPT.template,
+    ]).encode("utf-8")).hexdigest()
+
+    fingerprints = [
+        section_fingerprint(sec["heading"], "\n".join(sec["content"]).strip()) for sec in flat_sections
+    ]
+    yield {
+        "event": "sections",
+        "count": len(flat_sections),
+        "headings": [sec["heading"] for sec in flat_sections],
+        "fingerprints": fingerprints,
+        "namespace": dedup_namespace,
+    }
+
+    # Revision of a stored document: only changed and added sections need
+    # the LLM passes
+    if find_revision is not None:
+        new_sections = [
+            {"heading": sec["heading"], "content_hash": fingerprint}
+            for sec, fingerprint in zip(flat_sections, fingerprints)
+        ]
+        base = await find_revision(new_sections)
+        if base is not None:
+            carried, changes = diff_sections(base["sections"], new_sections, dedup_namespace)
+            completed = {**carried, **(completed or {})}
+            counts = change_counts(changes)
+            if debug:
+                print(f"[DEBUG] Revision of '{base['filename']}' ({base['matched_by']}): {counts}")
+            logger.info("Revision of summary %s: reusing %d of %d sections",
+                        base["summary_id"], len(carried), len(flat_sections))
+            yield {
+                "event": "revision",
+                "base_id": base["summary_id"],
+                "base_filename": base["filename"],
+                "matched_by": base["matched_by"],
+                "overlap": base["overlap"],
+                "counts": counts,
+                "changes": changes,
+            }
 
-    # We'll chunk each section if it’s large
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=100
-    )
+    # Every LLM round-trip below takes a slot from this semaphore, so the
+    # number of in-flight requests for this document never exceeds the limit.
+    semaphore = slots or asyncio.Semaphore(max(1, max_concurrency))
+    events: asyncio.Queue = asyncio.Queue()
 
-    summarized_sections = []
+    async def bounded(coro, stage_name: str):
+        async with semaphore:
+            with stage(stage_name):
+                return await coro
 
-    # Pass 1: Classification
-    for sec in flat_sections:
+    async def resolve_section(index: int, sec: Dict[str, Any]) -> Dict[str, Any]:
+        """Earlier results a section can reuse: job checkpoint or near-duplicate."""
         heading = sec["heading"]
         text = "\n".join(sec["content"]).strip()
 
-        # We'll feed just a snippet of the text for classification
-        sample_snippet = text[:1000]
-
-        relevant = await classify_heading_with_llm(
-            llm=llm_classify,
-            heading=heading,
-            snippet=sample_snippet,
-            capabilities_text=capabilities_text,
-        )
+        prior = (completed or {}).get(index)
+        if prior is not None and prior.get("heading") != heading:
+            prior = None    # section list changed since the checkpoint
+
+        signature = duplicate = numbers = None
+        if prior is None and section_index is not None:
+            signature = await asyncio.to_thread(section_index.signature, heading, text)
+            if signature is not None:
+                numbers = number_key(text)
+                duplicate = await section_index.lookup(dedup_namespace, signature, numbers)
+        if duplicate is not None:
+            if debug:
+                print(f"[DEBUG] Heading '{heading}' matches stored section "
+                      f"'{duplicate['heading']}' ({duplicate['similarity']:.2f}), reusing "
+                      f"{'it' if duplicate['summary'] or not duplicate['relevant'] else 'its verdict'}.")
+            prior = {"heading": heading, "relevant": duplicate["relevant"], "summary": duplicate["summary"]}
+            if duplicate["summary"] or not duplicate["relevant"]:
+                signature = None    # already indexed
+        return {"text": text, "prior": prior, "signature": signature, "numbers": numbers}
+
+    resolved = await asyncio.gather(*[
+        resolve_section(i, sec) for i, sec in enumerate(flat_sections)
+    ])
+
+    # Pass 1 runs in batches: sections still needing a verdict are packed
+    # into prompts of at most `classify_batch_tokens` section tokens; each
+    # section's task waits on its own future.
+    needs_verdict = [
+        {"index": i, "heading": sec["heading"], "snippet": res["text"][:1000]}
+        for i, (sec, res) in enumerate(zip(flat_sections, resolved))
+        if res["prior"] is None or res["prior"].get("relevant") is None
+    ]
+    loop = asyncio.get_running_loop()
+    verdicts = {item["index"]: loop.create_future() for item in needs_verdict}
+
+    # The local pre-filter settles clear-cut sections (heading rules, then the
+    # verdict model when confident); only the rest, plus audit samples, reach
+    # the LLM.
+    relevance_filter = get_relevance_filter()
+    to_classify = []
+    for item in needs_verdict:
+        local = (relevance_filter.decide(item["heading"], item["snippet"], dedup_namespace)
+                 if relevance_filter else None)
+        if local is not None and local["relevant"] is not None and not local["audit"]:
+            if debug:
+                print(f"[DEBUG] Heading '{item['heading']}' settled locally by {local['source']}: "
+                      f"{'RELEVANT' if local['relevant'] else 'IRRELEVANT'}")
+            verdicts[item["index"]].set_result(local["relevant"])
+        else:
+            item["local"] = local
+            to_classify.append(item)
+    if relevance_filter is not None and needs_verdict:
+        logger.info("Relevance pre-filter settled %d of %d sections locally",
+                    len(needs_verdict) - len(to_classify), len(needs_verdict))
+    speculate = set()
+    if speculative:
+        speculate = {
+            item["index"] for item in to_classify
+            if resolved[item["index"]]["prior"] is None
+            and speculation_prior(item["heading"], item.get("local")) >= SPECULATION_MIN_PRIOR
+        }
+    if classify_batch_tokens > 0:
+        batches = plan_classification_batches(
+            to_classify, classify_batch_tokens, model_name=llm_classify.model_name)
+    else:
+        batches = [[item] for item in to_classify]
+
+    async def classify_batch(batch: List[Dict[str, Any]]) -> None:
+        try:
+            results = None
+            if len(batch) > 1:
+                try:
+                    results = await bounded(
+                        classify_headings_batch(llm_classify, batch, capabilities_text), "classify")
+                except ValueError as exc:
+                    if debug:
+                        print(f"[DEBUG] Batched classification failed ({exc}); "
+                              f"classifying {len(batch)} sections one by one.")
+            if results is None:
+                results = await asyncio.gather(*[
+                    bounded(classify_heading_with_llm(
+                        llm=llm_classify,
+                        heading=item["heading"],
+                        snippet=item["snippet"],
+                        capabilities_text=capabilities_text,
+                    ), "classify")
+                    for item in batch
+                ])
+        except BaseException as exc:
+            for item in batch:
+                if not verdicts[item["index"]].done():
+                    verdicts[item["index"]].set_exception(exc)
+            raise
+        for item, relevant in zip(batch, results):
+            verdicts[item["index"]].set_result(relevant)
+        # every LLM verdict becomes training data for the pre-filter
+        for item, relevant in zip(batch, results):
+            if item.get("local") is not None:
+                await relevance_filter.record(
+                    item["heading"], item["snippet"], relevant, item["local"], dedup_namespace)
+
+    async def summarize_chunks(heading: str, text: str, in_flight: Optional[Dict[int, int]] = None):
+        """
+        Pass 2 calls for one section: (chunks, chunk summaries, finish time).
+        `in_flight` tracks the prompt tokens of calls holding a slot, which a
+        cancellation still pays for.
+        """
+        chunks = split_for_summary(text, llm_summary.model_name)
+
+        async def summarize_chunk(position: int, chunk_text: str) -> str:
+            if in_flight is None:
+                return await bounded(summarize_section(llm_summary, heading, chunk_text), "summarize")
+            async with semaphore:
+                with stage("summarize"):
+                    in_flight[position] = count_tokens(chunk_text, llm_summary.model_name)
+                    result = await summarize_section(llm_summary, heading, chunk_text)
+                    del in_flight[position]
+                    return result
+
+        chunk_summaries = await asyncio.gather(*[
+            summarize_chunk(position, chunk_text) for position, chunk_text in enumerate(chunks)
+        ])
+        return chunks, chunk_summaries, time.perf_counter()
+
+    async def process_section(index: int, sec: Dict[str, Any]) -> None:
+        heading = sec["heading"]
+        text = resolved[index]["text"]
+        prior = resolved[index]["prior"]
+        signature = resolved[index]["signature"]
+        numbers = resolved[index]["numbers"]
+
+        # Speculative Pass 2, started before the verdict is in; its calls are
+        # traced separately so a cancelled run's tokens can be reported
+        speculation = None
+        if index in speculate:
+            if debug:
+                print(f"[DEBUG] Speculatively summarizing '{heading}' during classification.")
+            in_flight: Dict[int, int] = {}
+            with pipeline_trace() as spec_trace:
+                spec_task = asyncio.create_task(summarize_chunks(heading, text, in_flight))
+            speculation = (spec_task, spec_trace, time.perf_counter())
+
+        try:
+            # Pass 1: Classification (we feed just a snippet of the text)
+            if prior is not None and prior.get("relevant") is not None:
+                relevant = prior["relevant"]
+            else:
+                relevant = await verdicts[index]
+        except BaseException:
+            if speculation is not None:
+                speculation[0].cancel()
+            raise
+        verdict_at = time.perf_counter()
+        events.put_nowait({
+            "event": "classified", "index": index, "heading": heading, "relevant": relevant,
+        })
 
         if not relevant:
+            if speculation is not None:
+                spec_task, spec_trace, _ = speculation
+                spec_task.cancel()
+                await asyncio.gather(spec_task, return_exceptions=True)
+                wasted = (spec_trace.llm["prompt_tokens"] + spec_trace.llm["completion_tokens"]
+                          + sum(in_flight.values()))
+                record_speculation(used=False, seconds_saved=0.0, tokens_wasted=wasted)
             if debug:
                 print(
                     f"[DEBUG] Skipping heading '{heading}' - classified IRRELEVANT.")
-            continue
+            if signature is not None:
+                await section_index.add(dedup_namespace, signature, heading, relevant=False)
+            return
+
+        if prior is not None and prior.get("summary"):
+            events.put_nowait({
+                "event": "summary", "index": index, "heading": heading, "summary": prior["summary"],
+            })
+            return
 
         if debug:
             print(f"[DEBUG] Heading '{heading}' is RELEVANT. Summarizing...")
 
-        # Pass 2: Summarize if relevant
-        docs = text_splitter.create_documents([text])
-        partial_summaries = []
-        for d in docs:
-            chunk_text = d.page_content.strip()
-            if not chunk_text:
-                continue
-            chunk_summary = await summarize_section(llm_summary, heading, chunk_text)
-            if chunk_summary:
-                partial_summaries.append(chunk_summary)
+        # Pass 2: Summarize if relevant – one call when the section fits the
+        # model's context, otherwise chunk summaries fan out concurrently
+        if speculation is not None:
+            spec_task, _, started = speculation
+            chunks, chunk_summaries, finished = await spec_task
+            # without speculation the same calls would have started at verdict_at
+            record_speculation(used=True, seconds_saved=min(finished, verdict_at) - started, tokens_wasted=0)
+        else:
+            chunks, chunk_summaries, _ = await summarize_chunks(heading, text)
+        partial_summaries = [cs for cs in chunk_summaries if cs]
 
         combined_summary = "\n".join(partial_summaries).strip()
         if not combined_summary:
             if debug:
                 print(f"[DEBUG] Summary empty for heading '{heading}'")
-            continue
-
-        # Strictly enforce no more than 5 bullet points in final output
-        final_summary = await enforce_bullet_limit(llm_summary, combined_summary)
-
-        summarized_sections.append({
-            "heading": heading,
-            "summary": final_summary
-        })
+            return
+
+        # Strictly enforce no more than 5 bullet points in final output: a
+        # single summary is trimmed locally; merged chunk summaries go through
+        # the LLM only when they actually exceed the limit
+        if count_bullets(combined_summary) <= MAX_BULLETS:
+            final_summary = combined_summary
+        elif len(chunks) == 1:
+            final_summary = truncate_bullets(combined_summary)
+        else:
+            final_summary = await bounded(enforce_bullet_limit(llm_summary, combined_summary), "enforce")
 
         if debug:
             print(
                 f"[DEBUG] Final summary for '{heading}':\n{final_summary}\n"
             )
 
-    return summarized_sections
+        if signature is not None and final_summary:
+            await section_index.add(
+                dedup_namespace, signature, heading, relevant=True, summary=final_summary, numbers=numbers)
+
+        events.put_nowait({
+            "event": "summary", "index": index, "heading": heading, "summary": final_summary,
+        })
+
+    # tasks copy the current context, so they inherit the upload scope
+    with (upload_scope(upload_id) if upload_id else nullcontext()):
+        tasks = [asyncio.create_task(classify_batch(batch)) for batch in batches]
+        tasks += [
+            asyncio.create_task(process_section(i, sec))
+            for i, sec in enumerate(flat_sections)
+        ]
+    all_done = asyncio.gather(*tasks)
+    try:
+        async for event in drain_until_done(all_done, events):
+            yield event
+        # surface the first section failure, if any
+        all_done.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def detect_headings_and_summarize_llm(
+    document_text: str,
+    openai_api_key: str,
+    debug: bool = True,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    classify_batch_tokens: int = CLASSIFY_BATCH_TOKENS,
+    slots: Optional[asyncio.Semaphore] = None,
+    upload_id: Optional[str] = None,
+    speculative: bool = SUMMARY_SPECULATIVE,
+) -> List[Dict[str, str]]:
+    """
+    Run the whole pipeline (see `summarize_sections_stream`) and collect the
+    summaries.
+
+    Returns list of { "heading": <h>, "summary": <s> } in original section order.
+    """
+    summaries = {}
+    async for event in summarize_sections_stream(
+        document_text, openai_api_key, debug=debug, max_concurrency=max_concurrency,
+        classify_batch_tokens=classify_batch_tokens, slots=slots, upload_id=upload_id,
+        speculative=speculative,
+    ):
+        if event["event"] == "summary":
+            summaries[event["index"]] = {
+                "heading": event["heading"],
+                "summary": event["summary"],
+            }
+    return [summaries[i] for i in sorted(summaries)]
@@ -0,0 +1,204 @@
+# app/uploads.py
+"""
+Upload staging: copy a multipart upload to a named temp file in fixed-size
+chunks, hashing as it goes, so no request ever holds the whole file in memory.
+
+Starlette already spools multipart bodies to disk past 1 MB; stage_upload()
+moves those bytes to a file that keeps the original suffix (the parsers pick
+their backend from it) and computes the SHA-256 used by the content cache in
+the same pass. Uploads larger than MAX_UPLOAD_BYTES are rejected with 413
+before any parse work starts.
+
+stage_batch() does the same for a multi-file upload, expanding ZIP archives
+into one staged file per PDF / DOC / DOCX member, within BATCH_MAX_DOCUMENTS
+documents and BATCH_MAX_BYTES extracted bytes.
+"""
+
+import os
+import asyncio
+import hashlib
+import tempfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "50"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(500 * 1024 * 1024)))
+
+DOCUMENT_SUFFIXES = (".pdf", ".doc", ".docx")
+
+
+class StagedUpload:
+    """An upload copied to disk: its path, original filename, size and SHA-256."""
+
+    def __init__(self, path: str, filename: str, size: int, content_hash: str):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.content_hash = content_hash
+
+    def cleanup(self) -> None:
+        Path(self.path).unlink(missing_ok=True)
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+
+def _batch_too_large(max_total_bytes: int) -> HTTPException:
+    return HTTPException(413, f"Batch exceeds {max_total_bytes // (1024 * 1024)} MB")
+
+
+def _copy_sync(src: BinaryIO, dest: BinaryIO, max_bytes: int) -> tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    src.seek(0)
+    while True:
+        chunk = src.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        digest.update(chunk)
+        dest.write(chunk)
+    return size, digest.hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file on disk, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(UPLOAD_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def stage_upload(
+    file: UploadFile,
+    directory: Optional[str] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> StagedUpload:
+    """
+    Copy `file` to a temp file in `directory` (system temp dir by default).
+    The caller owns the returned file and must call cleanup() when done.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    suffix = Path(file.filename or "").suffix.lower()
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as dest:
+            size, content_hash = await asyncio.to_thread(_copy_sync, file.file, dest, max_bytes)
+    except BaseException:
+        Path(path).unlink(missing_ok=True)
+        raise
+    return StagedUpload(path=path, filename=file.filename, size=size, content_hash=content_hash)
+
+
+def _extract_zip_sync(zip_path: str, directory: Optional[str], max_bytes: int,
+                      max_documents: int, max_total_bytes: int,
+                      batch_limit: Optional[int] = None) -> List[StagedUpload]:
+    """
+    Stage every PDF / DOC / DOCX member of a ZIP archive. Folders, other file
+    types and macOS metadata are skipped. Limits (`max_bytes` per member,
+    `max_total_bytes` for all members together) are checked on the declared
+    sizes first and again while inflating, so extraction stops as soon as the
+    running total is over. `batch_limit` is the batch-wide cap the error
+    message reports (defaults to `max_total_bytes`).
+    """
+    batch_limit = max_total_bytes if batch_limit is None else batch_limit
+    staged: List[StagedUpload] = []
+    inflated = 0
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                name = PurePosixPath(info.filename)
+                if info.is_dir() or name.name.startswith(".") or "__MACOSX" in name.parts:
+                    continue
+                suffix = name.suffix.lower()
+                if suffix not in DOCUMENT_SUFFIXES:
+                    continue
+                if len(staged) >= max_documents:
+                    raise HTTPException(413, f"More than {max_documents} documents in one batch")
+                if info.file_size > max_bytes:
+                    raise _too_large(max_bytes)
+                remaining = max_total_bytes - inflated
+                if info.file_size > remaining:
+                    raise _batch_too_large(batch_limit)
+                fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload_", dir=directory)
+                upload = StagedUpload(path=path, filename=name.name, size=0, content_hash="")
+                staged.append(upload)
+                with archive.open(info) as src, os.fdopen(fd, "wb") as dest:
+                    if remaining < max_bytes:
+                        try:
+                            upload.size, upload.content_hash = _copy_sync(src, dest, remaining)
+                        except HTTPException:
+                            raise _batch_too_large(batch_limit)
+                    else:
+                        upload.size, upload.content_hash = _copy_sync(src, dest, max_bytes)
+                inflated += upload.size
+    except zipfile.BadZipFile:
+        for upload in staged:
+            upload.cleanup()
+        raise HTTPException(400, "Invalid ZIP archive")
+    except BaseException:
+        for upload in staged:
+            upload.cleanup()
+        raise
+    return staged
+
+
+async def stage_batch(
+    files: List[UploadFile],
+    directory: Optional[str] = None,
+    max_documents: int = BATCH_MAX_DOCUMENTS,
+    max_total_bytes: int = BATCH_MAX_BYTES,
+) -> List[StagedUpload]:
+    """
+    Stage a multi-file upload: documents as they are, ZIP archives expanded
+    into their documents. The caller must call cleanup() on every result.
+
+    `max_total_bytes` bounds what is written to disk: each document, and each
+    ZIP member while it is inflated, only gets what is left of the budget.
+    """
+    staged: List[StagedUpload] = []
+    try:
+        for file in files:
+            suffix = Path(file.filename or "").suffix.lower()
+            if suffix not in DOCUMENT_SUFFIXES + (".zip",):
+                raise HTTPException(400, f"Unsupported file type: {file.filename}")
+            remaining = max_total_bytes - sum(u.size for u in staged)
+            if suffix == ".zip" or remaining >= MAX_UPLOAD_BYTES:
+                # the archive itself is removed once expanded
+                upload = await stage_upload(file, directory)
+            else:
+                try:
+                    upload = await stage_upload(file, directory, max_bytes=remaining)
+                except HTTPException:
+                    raise _batch_too_large(max_total_bytes)
+            if suffix == ".zip":
+                try:
+                    staged += await asyncio.to_thread(
+                        _extract_zip_sync, upload.path, directory, MAX_UPLOAD_BYTES,
+                        max_documents - len(staged), remaining, max_total_bytes)
+                finally:
+                    upload.cleanup()
+            else:
+                staged.append(upload)
+            if len(staged) > max_documents:
+                raise HTTPException(413, f"More than {max_documents} documents in one batch")
+            if sum(u.size for u in staged) > max_total_bytes:
+                raise _batch_too_large(max_total_bytes)
+        if not staged:
+            raise HTTPException(400, "No PDF / DOC / DOCX documents in the upload")
+    except BaseException:
+        for upload in staged:
+            upload.cleanup()
+        raise
+    return staged
@@ -0,0 +1,159 @@
+# benchmarks/bench_clients.py
+"""
+Connection setup cost: ChatOpenAI clients built per document (the old
+behaviour) against the shared, pooled ones from app/clients.py.
+
+    python -m benchmarks.bench_clients --docs 10 --calls 30 --concurrency 8 --rtt 0.03
+
+A local HTTPS server (self-signed certificate made with the openssl CLI)
+answers /v1/chat/completions like the OpenAI API. --rtt simulates the network:
+every request costs one round trip, every new connection two more (TCP + TLS
+handshake), which is where per-document clients lose. Documents are processed
+one after another, each firing --calls requests with --concurrency in flight.
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKDIR = tempfile.mkdtemp(prefix="bench_clients_")
+CERT = os.path.join(WORKDIR, "cert.pem")
+KEY = os.path.join(WORKDIR, "key.pem")
+# both the per-document clients and the registry's pool trust this certificate
+os.environ["SSL_CERT_FILE"] = CERT
+
+from langchain.schema import HumanMessage  # noqa: E402
+from langchain_openai import ChatOpenAI  # noqa: E402
+
+from app.clients import ClientRegistry  # noqa: E402
+
+
+class FakeOpenAI:
+    """Minimal HTTP/1.1 keep-alive server speaking the chat completions API."""
+
+    def __init__(self, rtt: float, latency: float):
+        self.rtt = rtt
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        await asyncio.sleep(2 * self.rtt)       # TCP + TLS handshake round trips
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    name, _, value = line.partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.rtt + self.latency)
+                body = json.dumps({
+                    "id": f"chatcmpl-{self.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "gpt-3.5-turbo",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "- Task 1: requirement item"},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 50, "completion_tokens": 8, "total_tokens": 58},
+                }).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                    + f"content-length: {len(body)}\r\nconnection: keep-alive\r\n\r\n".encode("ascii")
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _make_certificate() -> None:
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", KEY, "-out", CERT, "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+
+
+async def _run_document(models: List[ChatOpenAI], calls: int, concurrency: int) -> List[float]:
+    """`calls` requests spread over the document's models, as the pipeline does."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def call(i: int) -> None:
+        async with semaphore:
+            t0 = time.perf_counter()
+            await models[i % len(models)].ainvoke([HumanMessage(content=f"section {i}")])
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(call(i) for i in range(calls)))
+    return latencies
+
+
+async def bench(mode: str, server: FakeOpenAI, args) -> None:
+    server.connections = server.requests = 0
+    registry = ClientRegistry() if mode == "registry" else None
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for _ in range(args.docs):
+        if registry is not None:
+            models = [registry.chat_model("offline", temperature=t) for t in (0.0, 0.1)]
+        else:
+            # what summarize_sections_stream used to build for every upload
+            models = [
+                ChatOpenAI(model_name="gpt-3.5-turbo", temperature=t, openai_api_key="offline", max_retries=0)
+                for t in (0.0, 0.1, 0.0)
+            ]
+        latencies += await _run_document(models, args.calls, args.concurrency)
+        if registry is None:
+            for model in models:
+                await model.root_async_client.close()
+    wall = time.perf_counter() - start
+    if registry is not None:
+        await registry.aclose()
+
+    print(f"\n== {mode}")
+    print(f"   wall {wall:.2f}s | requests {server.requests} | connections opened {server.connections}")
+    print(f"   call p50 {statistics.median(latencies) * 1000:.1f} ms | "
+          f"p95 {sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000:.1f} ms")
+
+
+async def main(args) -> None:
+    _make_certificate()
+    server = FakeOpenAI(args.rtt, args.latency)
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(CERT, KEY)
+    srv = await asyncio.start_server(server.handle, "127.0.0.1", 0, ssl=ctx)
+    port = srv.sockets[0].getsockname()[1]
+    os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"https://127.0.0.1:{port}/v1"
+    async with srv:
+        for mode in ("per-document", "registry"):
+            await bench(mode, server, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--calls", type=int, default=30, help="LLM calls per document")
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight calls per document")
+    parser.add_argument("--rtt", type=float, default=0.03, help="simulated network round trip (s)")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated model time per call (s)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,149 @@
+# benchmarks/bench_db.py
+"""
+Concurrent read/write load on the summaries database from several worker
+processes, as with `uvicorn --workers N`.
+
+    python -m benchmarks.bench_db --workers 4 --writers 2 --readers 6 --seconds 10
+
+Each worker process opens its own engine on the same SQLite file and runs
+writer tasks (store_summary with 10 sections, which also updates the FTS
+index) next to reader tasks (first /summaries/ page, a detail view and a
+full-text search). The run is repeated with the old settings (rollback
+journal, synchronous=FULL, the driver's 5 s busy timeout) and with the
+defaults from app/database.py, and reports throughput, p95 latency and
+"database is locked" errors for both.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CONFIGS = {
+    "legacy": {"DB_SQLITE_JOURNAL_MODE": "DELETE", "DB_SQLITE_SYNCHRONOUS": "FULL", "DB_BUSY_TIMEOUT_MS": "5000"},
+    "tuned": {},
+}
+WORDS = ("contractor shall provide automated regression testing deliverables schedule "
+         "security clearance reporting cloud migration helpdesk quality assurance").split()
+
+
+def _sections(rng: random.Random) -> List[Dict[str, str]]:
+    return [
+        {"heading": f"C.{i} {rng.choice(WORDS).title()}",
+         "summary": "\n".join("- " + " ".join(rng.choices(WORDS, k=12)) for _ in range(4))}
+        for i in range(10)
+    ]
+
+
+def _worker(worker_id: int, env: Dict[str, str], args, results) -> None:
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import select
+    from app.database import SessionLocal, Summary, engine
+    import app.search as search
+    from app.services import load_summary_sections, store_summary
+
+    search._available = True    # init_db ran in the parent process
+    stats = {"reads": 0, "writes": 0, "locked": 0, "errors": 0, "read_lat": [], "write_lat": []}
+
+    async def run(kind: str, seed: int, deadline: float) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                async with SessionLocal() as db:
+                    if kind == "write":
+                        await store_summary(db, f"w{worker_id}.pdf", f"{seed:x}{t0}", _sections(rng))
+                    else:
+                        res = await db.execute(
+                            select(Summary).order_by(Summary.upload_time.desc(), Summary.id.desc()).limit(50))
+                        rows = res.scalars().all()
+                        if rows:
+                            await load_summary_sections(db, rng.choice(rows).id)
+                        await search.search_summaries(db, rng.choice(WORDS), 20)
+            except Exception as exc:
+                stats["locked" if "locked" in str(exc) else "errors"] += 1
+                continue
+            key = "write" if kind == "write" else "read"
+            stats[key + "s"] += 1
+            stats[key + "_lat"].append(time.perf_counter() - t0)
+
+    async def main() -> None:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *(run("write", worker_id * 1000 + i, deadline) for i in range(args.writers)),
+            *(run("read", worker_id * 1000 + 500 + i, deadline) for i in range(args.readers)),
+        )
+        await engine.dispose()
+
+    asyncio.run(main())
+    results.put(stats)
+
+
+def _p95(values: List[float]) -> float:
+    return sorted(values)[int(0.95 * (len(values) - 1))] * 1000 if values else 0.0
+
+
+def _setup(env: Dict[str, str], rows: int) -> None:
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from app.database import SessionLocal, engine, init_db
+    from app.services import store_summary
+
+    async def main() -> None:
+        await init_db()
+        rng = random.Random(0)
+        async with SessionLocal() as db:
+            for i in range(rows):
+                await store_summary(db, f"seed{i}.pdf", f"seed{i}", _sections(rng))
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def bench(name: str, args) -> None:
+    workdir = tempfile.mkdtemp(prefix=f"bench_db_{name}_")
+    env = {"DATABASE_URL": f"sqlite+aiosqlite:///{workdir}/summaries.db", **CONFIGS[name]}
+
+    # schema (and a few hundred rows to read) from one process first
+    setup = multiprocessing.get_context("spawn").Process(target=_setup, args=(env, args.seed_rows))
+    setup.start()
+    setup.join()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(i, env, args, results)) for i in range(args.workers)]
+    for w in workers:
+        w.start()
+    collected = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+
+    total = {k: sum(c[k] for c in collected) for k in ("reads", "writes", "locked", "errors")}
+    reads = [x for c in collected for x in c["read_lat"]]
+    writes = [x for c in collected for x in c["write_lat"]]
+    print(f"\n== {name} ({args.workers} workers x {args.writers} writers + {args.readers} readers, {args.seconds}s)")
+    print(f"   writes {total['writes']:>6} ({total['writes'] / args.seconds:.0f}/s)  p95 {_p95(writes):.1f} ms")
+    print(f"   reads  {total['reads']:>6} ({total['reads'] / args.seconds:.0f}/s)  p95 {_p95(reads):.1f} ms")
+    print(f"   'database is locked' errors {total['locked']}, other errors {total['errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2, help="writer tasks per worker")
+    parser.add_argument("--readers", type=int, default=6, help="reader tasks per worker")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--seed-rows", type=int, default=300)
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    args = parser.parse_args()
+    for name in args.configs:
+        bench(name, args)
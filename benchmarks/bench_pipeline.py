@@ -0,0 +1,157 @@
+# benchmarks/bench_pipeline.py
+"""
+Offline throughput benchmark of the summarization pipeline.
+
+    python -m benchmarks.bench_pipeline --mode both --concurrency 1 4 16 \
+        --latency 0.2 --jitter 0.1 --rate-limit 0.02
+
+Nothing leaves the machine: ChatOpenAI is replaced by benchmarks.mock_llm's
+deterministic MockChatOpenAI and parse_document by a stub that serves the
+synthetic corpus (benchmarks/corpus.py).
+
+  pipeline  runs detect_headings_and_summarize_llm on each corpus document
+  endpoint  POSTs N concurrent uploads to /summarize-stream/ (in-process ASGI)
+
+For every run it reports wall time, LLM calls (and injected 429s), and
+p50 / p95 per pipeline stage from app.metrics spans. The response, parse and
+section-dedup caches are disabled so every run does the full work.
+
+The scheduler's RPM / TPM budgets apply as in production; they default to
+values high enough not to throttle the mock. Pass e.g. --tokens-per-minute
+160000 to see where the real budget becomes the bottleneck.
+
+--speculative turns on SUMMARY_SPECULATIVE (summaries started during
+classification); the report then adds the latency saved and tokens wasted.
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# every SQLite file the app opens is relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench_pipeline_"))
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ["LLM_CACHE_ENABLED"] = "0"
+os.environ["PARSE_CACHE_ENABLED"] = "0"
+os.environ["SECTION_DEDUP_ENABLED"] = "0"
+os.environ["REVISION_DETECTION_ENABLED"] = "0"
+
+
+def _budget_arg(flag: str, env: str, default: str) -> None:
+    """Scheduler budgets are read from env on first use, so set them before importing app."""
+    if flag in sys.argv:
+        os.environ[env] = sys.argv[sys.argv.index(flag) + 1]
+    else:
+        os.environ.setdefault(env, default)
+
+
+_budget_arg("--tokens-per-minute", "LLM_TOKENS_PER_MINUTE", "100000000")
+_budget_arg("--requests-per-minute", "LLM_REQUESTS_PER_MINUTE", "1000000")
+if "--speculative" in sys.argv:
+    os.environ["SUMMARY_SPECULATIVE"] = "1"
+
+import httpx  # noqa: E402
+
+import app.clients as clients  # noqa: E402
+import app.main as main_module  # noqa: E402
+import app.summarization as summarization  # noqa: E402
+from app.database import engine, init_db  # noqa: E402
+from app.metrics import pipeline_trace, quantile  # noqa: E402
+from benchmarks.corpus import SIZES, load_corpus  # noqa: E402
+from benchmarks.mock_llm import MockChatOpenAI, MockSettings, make_stub_parser  # noqa: E402
+
+STAGES = ("parse", "refine", "classify", "summarize", "enforce", "store")
+
+
+def _report(title: str, wall: float, trace, extra: Dict[str, str]) -> None:
+    llm = trace.llm
+    print(f"\n== {title}")
+    print(f"   wall {wall:.2f}s | LLM calls {llm['calls']} | 429s injected {MockSettings.rate_limited}"
+          + "".join(f" | {k} {v}" for k, v in extra.items()))
+    print(f"   {'stage':<10} {'spans':>6} {'p50 ms':>9} {'p95 ms':>9} {'total s':>9}")
+    for name in STAGES:
+        spans = trace.stages.get(name)
+        if spans:
+            print(f"   {name:<10} {len(spans):>6} {quantile(spans, 0.5) * 1000:>9.1f} "
+                  f"{quantile(spans, 0.95) * 1000:>9.1f} {sum(spans):>9.2f}")
+    spec = trace.speculation
+    if spec["used"] or spec["cancelled"]:
+        print(f"   speculation: {spec['used']} used, {spec['cancelled']} cancelled | "
+              f"section latency saved {spec['seconds_saved']:.2f}s | tokens wasted {spec['tokens_wasted']}")
+
+
+async def bench_pipeline(corpus: Dict[str, str], args) -> None:
+    for name, markdown in corpus.items():
+        MockSettings.configure(args.latency, args.jitter, args.rate_limit, args.seed)
+        start = time.perf_counter()
+        with pipeline_trace() as trace:
+            result = await summarization.detect_headings_and_summarize_llm(
+                markdown, "offline", debug=False)
+        _report(f"pipeline {name}", time.perf_counter() - start, trace,
+                {"sections summarized": str(len(result))})
+
+
+async def bench_endpoint(corpus: Dict[str, str], args) -> None:
+    transport = httpx.ASGITransport(app=main_module.app)
+    names = list(corpus)
+    for n in args.concurrency:
+        MockSettings.configure(args.latency, args.jitter, args.rate_limit, args.seed)
+        latencies: List[float] = []
+
+        async def upload(i: int, client: httpx.AsyncClient) -> None:
+            name = names[i % len(names)]
+            # unique bytes: the content-hash cache must not short-circuit
+            files = {"file": (f"{name}.pdf", uuid.uuid4().bytes, "application/pdf")}
+            t0 = time.perf_counter()
+            resp = await client.post("/summarize-stream/", files=files)
+            resp.raise_for_status()
+            if "COMPLETE" not in resp.text:
+                raise RuntimeError(f"upload {i} did not complete: {resp.text[-300:]}")
+            latencies.append(time.perf_counter() - t0)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            with pipeline_trace() as trace:
+                await asyncio.gather(*(upload(i, client) for i in range(n)))
+            wall = time.perf_counter() - start
+        _report(f"endpoint x{n} concurrent uploads", wall, trace, {
+            "uploads/min": f"{n / wall * 60:.1f}",
+            "upload p50": f"{quantile(latencies, 0.5):.2f}s",
+            "upload p95": f"{quantile(latencies, 0.95):.2f}s",
+        })
+
+
+async def main(args) -> None:
+    corpus = load_corpus(args.docs)
+    clients.ChatOpenAI = MockChatOpenAI
+    main_module.parse_document = make_stub_parser(corpus, args.parse_delay)
+    await init_db()
+    try:
+        if args.mode in ("pipeline", "both"):
+            await bench_pipeline(corpus, args)
+        if args.mode in ("endpoint", "both"):
+            await bench_endpoint(corpus, args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("pipeline", "endpoint", "both"), default="both")
+    parser.add_argument("--docs", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.2, help="mock LLM seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- seconds around --latency")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of calls failing with 429")
+    parser.add_argument("--parse-delay", type=float, default=0.5, help="stub parser seconds per upload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tokens-per-minute", type=int, help="scheduler TPM budget (LLM_TOKENS_PER_MINUTE)")
+    parser.add_argument("--requests-per-minute", type=int, help="scheduler RPM budget (LLM_REQUESTS_PER_MINUTE)")
+    parser.add_argument("--speculative", action="store_true", help="summarize likely-relevant sections during classification")
+    asyncio.run(main(parser.parse_args()))
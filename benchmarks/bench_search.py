@@ -0,0 +1,125 @@
+# benchmarks/bench_search.py
+"""
+Search latency vs. corpus size: FTS5 index (app/search.py) against the
+ILIKE scan it replaces.
+
+    python -m benchmarks.bench_search --sizes 1000 5000 20000 --repeat 20
+
+Builds a throwaway summaries.db in a temp directory with synthetic documents
+(10 sections each) and reports the median latency and the documents found
+(ILIKE/FTS, capped at 50) per query. For a single word, partly typed ones
+included, FTS must find at least as many as ILIKE.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# DATABASE_URL is relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="bench_search_"))
+
+from sqlalchemy.future import select  # noqa: E402
+
+from app.database import SessionLocal, Summary, SummarySection, engine, init_db  # noqa: E402
+from app.search import search_summaries  # noqa: E402
+
+engine.echo = False
+
+WORDS = (
+    "contractor shall provide deliverables schedule performance period option "
+    "security clearance personnel training reporting monthly quarterly invoice "
+    "cloud migration software license maintenance support helpdesk network "
+    "facility inspection quality assurance surveillance plan transition "
+    "government furnished equipment travel subcontracting small business"
+).split()
+RARE = ["cybersecurity", "fedramp", "cmmc", "hazmat", "telehealth", "geospatial"]
+# "maintenan" and "surveillan" run past their porter stems ("mainten", "surveil")
+QUERIES = ["cybersecurity", "quality assurance", "telehe", "fedramp cloud", "maintenan", "surveillan"]
+
+
+def _text(rng: random.Random, n: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(n)]
+    if rng.random() < 0.05:
+        words[rng.randrange(n)] = rng.choice(RARE)
+    return " ".join(words)
+
+
+async def populate(target: int, have: int, rng: random.Random) -> None:
+    start = datetime(2024, 1, 1)
+    async with SessionLocal() as db:
+        for i in range(have, target):
+            row = Summary(filename=f"rfp_{i}.pdf", upload_time=start + timedelta(minutes=i), summary="")
+            db.add(row)
+            await db.flush()
+            db.add_all(
+                SummarySection(
+                    summary_id=row.id, position=p,
+                    heading=f"{p + 1}. {_text(rng, 3).title()}",
+                    summary="\n".join(f"- {_text(rng, 14)}" for _ in range(4)),
+                )
+                for p in range(10)
+            )
+            if i % 500 == 0:
+                await db.commit()
+        await db.commit()
+
+
+async def ilike_search(db, q: str, limit: int = 50):
+    matching = select(SummarySection.summary_id).where(
+        SummarySection.heading.ilike(f"%{q}%") | SummarySection.summary.ilike(f"%{q}%"))
+    res = await db.execute(
+        select(Summary.id, Summary.filename, Summary.upload_time)
+        .where(Summary.filename.ilike(f"%{q}%") | Summary.id.in_(matching))
+        .order_by(Summary.upload_time.desc(), Summary.id.desc())
+        .limit(limit)
+    )
+    return res.all()
+
+
+async def fts_search(db, q: str, limit: int = 50):
+    rows, _ = await search_summaries(db, q, limit)
+    return rows
+
+
+async def time_query(fn, q: str, repeat: int) -> float:
+    samples = []
+    async with SessionLocal() as db:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            rows = await fn(db, q)
+            samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000, len(rows)
+
+
+async def main(sizes, repeat: int) -> None:
+    await init_db()
+    rng = random.Random(0)
+    have = 0
+    print(f"{'docs':>7} {'query':<20} {'ilike ms':>10} {'fts ms':>10} {'speedup':>8} {'hits':>11}")
+    for size in sorted(sizes):
+        await populate(size, have, rng)
+        have = size
+        for q in QUERIES:
+            slow, ilike_hits = await time_query(ilike_search, q, repeat)
+            fast, fts_hits = await time_query(fts_search, q, repeat)
+            print(f"{size:>7} {q:<20} {slow:>10.2f} {fast:>10.2f} {slow / fast:>7.1f}x "
+                  f"{ilike_hits:>5}/{fts_hits:<5}")
+            if " " not in q:
+                # a single (partly typed) word: FTS must find whatever ILIKE finds
+                assert fts_hits >= ilike_hits, f"FTS found {fts_hits} documents for {q!r}, ILIKE {ilike_hits}"
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
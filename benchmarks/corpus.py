@@ -0,0 +1,101 @@
+# benchmarks/corpus.py
+"""
+Synthetic RFP corpus for the offline benchmarks.
+
+    python -m benchmarks.corpus          # write benchmarks/corpus/*.md to inspect
+
+Documents are generated from a fixed seed, so every run sees the same
+corpus in the markdown convention the
+parsers emit: numbered '#' headings in the schemes seen in solicitations
+("1.", "C.3", "IV.", "Section 5"), bold '##' sub-headings that refinement
+demotes to body text, and a mix of relevant (scope, tasks, personnel) and
+irrelevant (travel, GFE, FAR clauses) sections, some long enough to need
+several summary chunks.
+"""
+
+import os
+import random
+from typing import Dict, List
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+# name -> (sections, mean words per section, sections with long bodies)
+SIZES = {
+    "rfp_small": (12, 200, 0),
+    "rfp_medium": (35, 250, 1),
+    "rfp_large": (90, 220, 2),
+}
+
+RELEVANT_TOPICS = [
+    "Scope of Work", "Tasks and Deliverables", "Software Testing Requirements",
+    "Key Personnel", "Performance Objectives", "Optional Surge Support",
+    "Test Automation", "Quality Assurance Surveillance", "Background",
+    "General Information", "Continuous Integration Support", "Requirements Traceability",
+]
+IRRELEVANT_TOPICS = [
+    "Travel", "Government-Furnished Equipment", "Inspection and Acceptance",
+    "Place of Performance", "Period of Performance", "FAR Clauses Incorporated by Reference",
+    "Applicable Documents", "Security Clearance Logistics", "Invoicing Instructions",
+]
+VOCABULARY = (
+    "the contractor shall provide deliver maintain support perform test automated regression "
+    "performance load security accessibility section compliance system software application "
+    "environment release schedule monthly report plan government agency program office "
+    "requirements documentation defects tracking integration pipeline staff qualified "
+    "experience years certification within days after award period option base year "
+    "quality metrics coverage acceptance criteria review approval data management"
+).split()
+
+
+def _heading(rng: random.Random, number: int, topic: str) -> str:
+    style = rng.random()
+    if style < 0.5:
+        return f"# {number}. {topic}"
+    if style < 0.7:
+        return f"# C.{number} {topic}"
+    if style < 0.85:
+        return f"# Section {number} {topic}"
+    roman = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+    return f"# {roman[(number - 1) % 10]}. {topic}"
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    sentences, remaining = [], words
+    while remaining > 0:
+        n = min(remaining, rng.randint(8, 22))
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(n))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= n
+    return " ".join(sentences)
+
+
+def generate(name: str, seed: int = 0) -> str:
+    sections, mean_words, long_sections = SIZES[name]
+    rng = random.Random(f"{name}:{seed}")
+    long_at = set(rng.sample(range(sections), long_sections))
+    out: List[str] = []
+    for i in range(sections):
+        topics = RELEVANT_TOPICS if rng.random() < 0.6 else IRRELEVANT_TOPICS
+        out.append(_heading(rng, i + 1, rng.choice(topics)))
+        words = 9000 if i in long_at else max(40, int(rng.gauss(mean_words, mean_words / 3)))
+        while words > 0:
+            if rng.random() < 0.15:
+                out.append(f"## {rng.choice(RELEVANT_TOPICS)} Overview")
+            chunk = min(words, rng.randint(60, 160))
+            out.append(_paragraph(rng, chunk))
+            words -= chunk
+    return "\n".join(out) + "\n"
+
+
+def load_corpus(names: List[str] = None) -> Dict[str, str]:
+    """name -> markdown for the requested corpus documents (all by default)."""
+    return {name: generate(name) for name in names or list(SIZES)}
+
+
+if __name__ == "__main__":
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    for name in SIZES:
+        markdown = generate(name)
+        with open(os.path.join(CORPUS_DIR, f"{name}.md"), "w", encoding="utf-8") as fh:
+            fh.write(markdown)
+        print(f"{name}: {len(markdown.splitlines())} lines, {len(markdown) // 1024} KiB")
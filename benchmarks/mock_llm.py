@@ -0,0 +1,116 @@
+# benchmarks/mock_llm.py
+"""
+Deterministic stand-ins for the paid services, for offline benchmarks.
+
+MockChatOpenAI answers every prompt summarization.py sends (heading
+refinement, single and batched classification, section summaries, bullet
+enforcement) with a reply derived from the prompt text, after a configurable
+latency + jitter. A share of calls can fail with a real openai.RateLimitError
+so the scheduler's retry path is exercised.
+
+make_stub_parser() builds a stand-in for app.parser.parse_document: it
+returns the corpus document named by the upload's file stem after a
+simulated delay.
+"""
+
+import re
+import json
+import random
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import openai
+from langchain.schema import AIMessage
+
+IRRELEVANT_KEYWORDS = (
+    "travel", "government-furnished", "inspection", "place of performance",
+    "period of performance", "far clauses", "applicable documents", "clearance logistics",
+    "invoicing",
+)
+
+
+class MockSettings:
+    latency = 0.2           # seconds per call
+    jitter = 0.1            # +/- uniform seconds
+    rate_limit_rate = 0.0   # share of calls answered with HTTP 429
+    seed = 0
+
+    calls = 0
+    rate_limited = 0
+    _rng = random.Random(0)
+
+    @classmethod
+    def configure(cls, latency: float, jitter: float, rate_limit_rate: float, seed: int = 0) -> None:
+        cls.latency, cls.jitter, cls.rate_limit_rate, cls.seed = latency, jitter, rate_limit_rate, seed
+        cls._rng = random.Random(seed)
+        cls.calls = cls.rate_limited = 0
+
+
+def _is_irrelevant(heading: str) -> bool:
+    heading = heading.lower()
+    return any(k in heading for k in IRRELEVANT_KEYWORDS)
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def _bullets(seed_text: str, count: int) -> str:
+    return "\n".join(f"- Task {i + 1}: {_digest(seed_text) % 997} requirement item" for i in range(count))
+
+
+def _reply(prompt: str) -> str:
+    if "TRUE_HEADING" in prompt:
+        ids = re.findall(r"^(\d+): ", prompt, re.MULTILINE)
+        return "\n".join(f"{i}: TRUE_HEADING" for i in ids)
+    if "JSON array" in prompt:
+        blocks = re.findall(r"^### Section (\d+)\nHeading: (.*)$", prompt, re.MULTILINE)
+        return json.dumps([
+            {"id": int(i), "verdict": "IRRELEVANT" if _is_irrelevant(h) else "RELEVANT"}
+            for i, h in blocks
+        ])
+    if 'Output exactly one word' in prompt:
+        heading = re.search(r"^Heading: (.*)$", prompt, re.MULTILINE).group(1)
+        return "IRRELEVANT" if _is_irrelevant(heading) else "RELEVANT"
+    if "at most 5 bullet points" in prompt:
+        return _bullets(prompt, 5)
+    # section summary: 3-7 bullets, so some exceed the limit
+    return _bullets(prompt, 3 + _digest(prompt) % 5)
+
+
+class MockChatOpenAI:
+    """Accepts the ChatOpenAI constructor arguments summarization.py uses."""
+
+    def __init__(self, model_name: str = "gpt-3.5-turbo", temperature: float = 0.0, **_: Any):
+        self.model_name = model_name
+        self.temperature = temperature
+
+    async def ainvoke(self, messages: List[Any], *args: Any, **kwargs: Any) -> AIMessage:
+        settings = MockSettings
+        settings.calls += 1
+        delay = max(0.0, settings.latency + settings._rng.uniform(-settings.jitter, settings.jitter))
+        await asyncio.sleep(delay)
+        if settings._rng.random() < settings.rate_limit_rate:
+            settings.rate_limited += 1
+            response = httpx.Response(
+                429,
+                headers={"retry-after": "0.1"},
+                request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"),
+            )
+            raise openai.RateLimitError("mock rate limit", response=response, body=None)
+        return AIMessage(content=_reply(str(messages[-1].content)))
+
+
+def make_stub_parser(corpus: Dict[str, str], delay: float = 0.5):
+    """parse_document stand-in returning corpus[<file stem>]."""
+
+    async def stub_parse_document(path, filename, engine=None, progress=None, content_hash=None) -> str:
+        await asyncio.sleep(delay)
+        if progress:
+            progress(1, 1)
+        return corpus[Path(filename).stem]
+
+    return stub_parse_document
@@ -17,6 +17,18 @@ const formatDate = (iso) =>
 
 const coerceId = (v) => Number(v); // ensures all ids are numbers
 
+/* search snippets mark hits with <mark>…</mark>; render them without innerHTML */
+const Highlighted = ({ text }) =>
+    text.split(/(<mark>.*?<\/mark>)/g).map((part, i) =>
+        part.startsWith('<mark>') ? (
+            <mark key={i} className="bg-blue-900 text-blue-100 rounded px-0.5">
+                {part.slice(6, -7)}
+            </mark>
+        ) : (
+            part
+        )
+    );
+
 const LoadingBar = ({ phase }) => {
     const targets = { uploading: 10, parsing: 40, identifying: 60, summarizing: 80, storing: 100 };
     const [pct, setPct] = useState(0);
@@ -108,6 +120,7 @@ const SolicitationDashboard = () => {
     const [file, setFile] = useState(null);
     const [phase, setPhase] = useState('');
     const [summaries, setSummaries] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [openSummaries, setOpenSummaries] = useState([]);
     const [view, setView] = useState('upload');
     const [error, setError] = useState(null);
@@ -118,16 +131,18 @@ const SolicitationDashboard = () => {
     const [deleteTarget, setDeleteTarget] = useState(null);
 
     /* api helpers */
-    const fetchSummaries = async (q = '') => {
-        setIsSearching(!!q);
+    const fetchSummaries = async (q = '', cursor = null) => {
+        setIsSearching(!!q && !cursor);
         try {
-            const url = q
-                ? `${API_BASE}/summaries/?search=${encodeURIComponent(q)}`
-                : `${API_BASE}/summaries/`;
-            const res = await fetch(url);
+            const params = new URLSearchParams();
+            if (q) params.set('search', q);
+            if (cursor) params.set('cursor', cursor);
+            const res = await fetch(`${API_BASE}/summaries/?${params}`);
             if (!res.ok) throw new Error('Failed to fetch summaries');
             const data = await res.json();
-            setSummaries(data.map((s) => ({ ...s, id: coerceId(s.id) })));
+            const items = data.items.map((s) => ({ ...s, id: coerceId(s.id) }));
+            setSummaries((prev) => (cursor ? [...prev, ...items] : items));
+            setNextCursor(data.next_cursor);
         } catch (e) {
             setError(e.message);
         } finally {
@@ -135,6 +150,22 @@ const SolicitationDashboard = () => {
         }
     };
 
+    /* list rows carry headings only; the sections are fetched on open */
+    const openSummary = async (s) => {
+        if (!openSummaries.find((x) => x.id === s.id)) {
+            try {
+                const res = await fetch(`${API_BASE}/summaries/${s.id}`);
+                if (!res.ok) throw new Error('Failed to fetch summary');
+                const full = await res.json();
+                setOpenSummaries((p) => [...p, { ...full, id: coerceId(full.id) }]);
+            } catch (e) {
+                setError(e.message);
+                return;
+            }
+        }
+        setView(s.id);
+    };
+
     useEffect(() => {
         if (view === 'database') fetchSummaries();
     }, [view]);
@@ -185,7 +216,7 @@ const SolicitationDashboard = () => {
                 else if (payload.startsWith('{')) {
                     const raw = JSON.parse(payload);
                     const saved = { ...raw, id: coerceId(raw.id) };
-                    setSummaries([saved]);
+                    setSummaries([{ ...saved, headings: saved.summary.map((sec) => sec.heading) }]);
                     setOpenSummaries((p) => [...p, saved]);
                     setView(saved.id);
                     setToast('✅ Document summarized and saved!');
@@ -371,11 +402,7 @@ const SolicitationDashboard = () => {
                                         <div className="flex justify-between items-center mb-2">
                                             <h3
                                                 className="text-lg font-bold text-gray-200 cursor-pointer hover:text-blue-400"
-                                                onClick={() => {
-                                                    if (!openSummaries.find((x) => x.id === s.id))
-                                                        setOpenSummaries((p) => [...p, s]);
-                                                    setView(s.id);
-                                                }}
+                                                onClick={() => openSummary(s)}
                                             >
                                                 {s.filename || `Document #${s.id}`}
                                             </h3>
@@ -386,18 +413,25 @@ const SolicitationDashboard = () => {
                                         <p className="text-sm text-gray-400">Uploaded on: {formatDate(s.upload_time)}</p>
                                         <p
                                             className="text-gray-300 mt-2 line-clamp-2 cursor-pointer hover:text-blue-100"
-                                            onClick={() => {
-                                                if (!openSummaries.find((x) => x.id === s.id))
-                                                    setOpenSummaries((p) => [...p, s]);
-                                                setView(s.id);
-                                            }}
+                                            onClick={() => openSummary(s)}
                                         >
-                                            {Array.isArray(s.summary)
-                                                ? s.summary.map((sec) => sec.heading).join(' • ').slice(0, 120) + '…'
-                                                : String(s.summary).slice(0, 120) + '…'}
+                                            {s.headings.join(' • ').slice(0, 120) + '…'}
                                         </p>
+                                        {s.snippet && (
+                                            <p className="text-sm text-gray-400 mt-1 whitespace-pre-line">
+                                                <Highlighted text={s.snippet} />
+                                            </p>
+                                        )}
                                     </div>
                                 ))}
+                                {nextCursor && (
+                                    <button
+                                        onClick={() => fetchSummaries(searchQuery, nextCursor)}
+                                        className="w-full py-2 text-sm text-gray-400 hover:text-gray-200 border border-gray-700 rounded-lg"
+                                    >
+                                        Load more
+                                    </button>
+                                )}
                             </div>
                         ) : (
                             <div className="text-center py-10 text-gray-400">